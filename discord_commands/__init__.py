@@ -1,4 +1,4 @@
-from discord_commands import ask, change_status, choose, role, tarot, fortune, steam, neodb, timezone, aww, summary, reset, misc
+from discord_commands import ask, change_status, choose, role, tarot, fortune, steam, neodb, timezone, aww, summary, reset, misc, trigger
 
 __all__ = ["setup_all"]
 
@@ -18,5 +18,7 @@ def setup_all(bot):
     summary.setup_summarycheck(bot)
     change_status.setup(bot)
     reset.setup(bot)
+    trigger.setup(bot)
+    trigger.setup_triggerword(bot)
     misc.setup_help(bot)
     misc.setup_buymeacoffee(bot)
\ No newline at end of file
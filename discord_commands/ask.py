@@ -1,4 +1,4 @@
-import asyncio
+import time
 import discord
 import logging
 from discord.ext import commands
@@ -6,10 +6,12 @@ from discord import app_commands
 from typing import Optional
 from openai.types.chat import ChatCompletionMessageParam
 
-from utils.gpt_call import gpt_call
-from utils.constants import DEFAULT_SYSTEM_PROMPT, MAX_HISTORY, SUMMARY_TRIGGER, DEFAULT_MODEL
+from utils.gpt_call import gpt_call, gpt_stream
+from utils.constants import DEFAULT_SYSTEM_PROMPT, SUMMARY_TRIGGER, DEFAULT_MODEL, ASK_STREAMING, STREAM_EDIT_INTERVAL, DISCORD_MESSAGE_LIMIT
 from utils.locks import get_user_lock
-from utils.auto_summary import summarize_history
+from utils.context import build_chat_context
+from utils.translation_cache import get_cached_translation, set_cached_translation, get_translation_cache_stats
+from utils.auto_summary import enqueue_summary
 from utils.save_and_load import save_histories
 from utils.storage import history_storage, summary_storage, role_storage, user_histories, user_summaries, user_roles
 
@@ -26,6 +28,49 @@ translate_choices = [
     app_commands.Choice(name="意大利语 Italian", value="Italian"),
 ]
 
+# ============================== #
+# 流式回复
+# ============================== #
+def split_message(text: str) -> list[str]:
+    """按 Discord 单条消息上限切分文本"""
+    return [text[i:i + DISCORD_MESSAGE_LIMIT] for i in range(0, len(text), DISCORD_MESSAGE_LIMIT)] or [""]
+
+
+async def stream_reply(interaction: discord.Interaction, messages: list[ChatCompletionMessageParam]) -> str:
+    """流式调用 GPT，边生成边编辑 followup 消息，返回完整回复"""
+    text = ""
+    message = None
+    last_edit = 0.0
+
+    async for delta in gpt_stream(
+        model=DEFAULT_MODEL,
+        messages=messages,
+        temperature=0.7,
+        max_tokens=1000,
+        timeout=60,
+    ):
+        text += delta
+        now = time.monotonic()
+        # 收到第一段内容就立刻发送，之后按固定间隔编辑
+        if message is None:
+            message = await interaction.followup.send(split_message(text)[0], wait=True)
+            last_edit = now
+        elif now - last_edit >= STREAM_EDIT_INTERVAL:
+            await message.edit(content=split_message(text)[0])
+            last_edit = now
+
+    reply = text or "❌ GPT 没有返回任何内容哦 >.<"
+    chunks = split_message(reply)
+    if message is None:
+        await interaction.followup.send(chunks[0])
+    else:
+        await message.edit(content=chunks[0])
+    # 超出单条消息上限的部分另外发送
+    for chunk in chunks[1:]:
+        await interaction.followup.send(chunk)
+
+    return reply
+
 # ============================== #
 # /ask 指令（含translate_to功能）
 # ============================== #
@@ -56,6 +101,13 @@ def setup(bot: commands.Bot) -> None:
             lang = custom_lang or (translate_to.value if translate_to else None)
 
             if lang:
+                # 先查翻译缓存，命中则不再调用 GPT
+                cached = get_cached_translation(prompt, lang)
+                if cached:
+                    await interaction.followup.send(cached)
+                    logging.info(f"📦 翻译命中缓存：{lang} | 用户 {user_id} | {get_translation_cache_stats()}")
+                    return
+
                 translate_system_prompt = "你是专业的多语种翻译助手。请将用户提供的文本翻译为指定语言，确保术语准确、语言自然，避免直译和机翻痕迹。文学性文本请遵循“信、达、雅”的标准。仅返回翻译结果，不要添加解释或多余内容。"
                 translate_user_prompt = f"请将以下内容翻译成{lang}：\n\n{prompt}"
 
@@ -73,8 +125,11 @@ def setup(bot: commands.Bot) -> None:
                         timeout=60,
                     )
                     logging.info(f"✅ 模型调用成功：{response.model}")
-                    reply = response.choices[0].message.content or "❌ GPT 没有返回任何内容哦 >.<"
+                    content = response.choices[0].message.content
+                    reply = content or "❌ GPT 没有返回任何内容哦 >.<"
                     await interaction.followup.send(reply)
+                    if content:
+                        set_cached_translation(prompt, lang, content)
                     
                     logging.info(f"✅ 翻译成功：{lang} | 用户 {user_id}\n原文：\n{prompt}\n翻译后：\n{reply}")
                     return
@@ -87,55 +142,45 @@ def setup(bot: commands.Bot) -> None:
             
             # ============ 普通提问模式 ============ #
             # 获取历史记录
-            history_storage.data[user_id].append({"role": "user", "content": prompt})
-
-            # 裁剪用于聊天上下文
-            chat_context = history_storage.data[user_id][-MAX_HISTORY:]
-
-            # 构造 messages
-            messages: list[ChatCompletionMessageParam] = []
-
-            # 1. 所有情况下都加入 user 专属或默认 role
-            custom_role = user_roles.get(user_id, "")
-            system_prompt = f"{DEFAULT_SYSTEM_PROMPT}\n\n[我的自定义角色设定如下，请参考我的角色设定：]\n{custom_role}" if custom_role else DEFAULT_SYSTEM_PROMPT
-            messages.append({"role": "system", "content": system_prompt})
+            history_storage.data.setdefault(user_id, []).append({"role": "user", "content": prompt})
 
-            # 2. 如果有摘要，再加一条
-            if user_id in user_summaries:
-                messages.append({
-                    "role":
-                    "user",
-                    "content":
-                    f"[以下是我的背景信息，供你参考]\n{user_summaries[user_id]}"
-                })
-
-            messages.extend(chat_context)
+            # 按 token 预算构造 messages：system prompt → 角色设定 → 摘要 → 最新对话
+            messages, context_tokens = build_chat_context(
+                system_prompt=DEFAULT_SYSTEM_PROMPT,
+                custom_role=user_roles.get(user_id, ""),
+                summary=user_summaries.get(user_id, ""),
+                history=history_storage.data[user_id],
+            )
+            logging.info(f"🧮 用户 {user_id} 的上下文：{len(messages)} 条消息，约 {context_tokens} tokens")
 
             try:
-                # 调用 GPT
-                response = await gpt_call(
-                    model=DEFAULT_MODEL,
-                    messages=messages,  # 调用包含摘要的完整消息
-                    temperature=0.7,
-                    max_tokens=1000,
-                    timeout=60,
-                )
-                logging.info(f"✅ 模型调用成功：{response.model}")
+                # 调用 GPT（流式模式下回复已在生成过程中发送）
+                if ASK_STREAMING:
+                    reply = await stream_reply(interaction, messages)
+                else:
+                    response = await gpt_call(
+                        model=DEFAULT_MODEL,
+                        messages=messages,  # 调用包含摘要的完整消息
+                        temperature=0.7,
+                        max_tokens=1000,
+                        timeout=60,
+                    )
+                    logging.info(f"✅ 模型调用成功：{response.model}")
+                    reply = response.choices[0].message.content or "❌ GPT 没有返回任何内容哦 >.<"
                 logging.info(f"用户 {user_id} 提问：{prompt}")
 
-                reply = response.choices[0].message.content or "❌ GPT 没有返回任何内容哦 >.<"
-
                 # 添加 AI 回复到历史
                 history_storage.data[user_id].append({"role": "assistant", "content": reply})
-                # 保存
-                await asyncio.to_thread(save_histories)
+                # 保存（write-behind，由后台 flusher 合并写入）
+                save_histories(user_id)
 
-                # 如果历史太长则先摘要
+                # 如果历史太长则交给后台队列生成摘要，不阻塞本次回复
                 if len(history_storage.data[user_id]) >= SUMMARY_TRIGGER:
                     logging.info(f"🔍 当前完整历史：{len(history_storage.data[user_id])}")
-                    await summarize_history(user_id)
+                    enqueue_summary(user_id)
 
-                await interaction.followup.send(reply)
+                if not ASK_STREAMING:
+                    await interaction.followup.send(reply)
                 logging.info(f"✅ 回复已发送给用户 {user_id}，当前完整历史：{len(history_storage.data[user_id])}")
 
             except Exception as e:
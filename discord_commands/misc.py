@@ -30,7 +30,7 @@ def setup_help(bot: commands.Bot) -> None:
             "🔮 `/tarot <困惑> [可选：抽牌数]` - 抽一张或多张塔罗牌解读你的困惑\n"
             "🧙‍♀️ `/fortune` - 占卜你的今日运势并解读\n"
             "🐾 `/aww <subreddit>` - 从Reddit上随机抽一只可爱动物\n"
-            "🎮 `/steam <游戏名称> [可选：地区]` - 查询 Steam 游戏信息\n"
+            "🎮 `/steam <游戏名称> [可选：地区] [可选：比价地区]` - 查询 Steam 游戏信息或多区比价\n"
             "🌠 `/neodb <名称> [可选：媒体类型]` - 查询书影音等媒体信息\n"
             "🕒 `/timezone` - 显示当前时间与全球多个时区的对照\n\n"
             "🙋‍♀️ `/setrole <风格设定>` - 设置专属的角色风格，或者希望bot记住的事情\n"
@@ -39,6 +39,7 @@ def setup_help(bot: commands.Bot) -> None:
             "📝 `/summary` - 总结以往对话生成摘要\n"
             "📝 `/summarycheck` - 查看你的对话摘要\n"
             "😶 `/trigger <on/off>` - 开启或关闭你的发言自动触发'咋办'\n"
+            "😶 `/triggerword <操作> [触发词]` - 查看或管理本服务器的触发词\n"
             "🧹 `/reset` - 重置清空所有历史\n\n"
             "🐣 `/help` - 列出所有可用指令\n"
             "🌈 `/buymeacoffee` - 如果你喜欢咋办，可以请作者喝杯咖啡哦 ☕️ :3c\n"
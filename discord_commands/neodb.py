@@ -1,4 +1,3 @@
-import aiohttp
 import logging
 import os
 import discord
@@ -7,7 +6,9 @@ from discord import Interaction, Embed, app_commands, SelectOption
 from discord.ui import Select, View
 from typing import Optional
 from utils.embed import get_random_embed_color
-from utils.neodb import get_neodb_cached_result, set_neodb_cache
+from utils.neodb import get_neodb_cached_result, set_neodb_cache, suggest_neodb_titles
+from utils.http_client import get_json
+from utils.async_cache import AsyncCache
 
 # ============================== #
 # /neodb 指令
@@ -55,17 +56,10 @@ media_type_choices = [
 
 NEODB_SEARCH_API = "https://neodb.social/api/catalog/search"
 
-async def neodb_search(title: str, media_type: Optional[str] = None):
-    # 创建缓存 key
-    query_key = f"{title.strip().lower()}::{media_type or 'any'}"
-    
-    # 1. 先查缓存
-    cached = get_neodb_cached_result(query_key)
-    if cached:
-        logging.info(f"✅ 命中缓存：{query_key}")
-        return cached
-    
-    # 2. 缓存未命中，发起请求
+# 合并相同查询的并发请求，并在短时间内记住“无结果/请求失败”（正常结果由 utils.neodb 持久化缓存）
+neodb_loader = AsyncCache(ttl=0, negative_ttl=300)
+
+async def fetch_neodb(title: str, media_type: Optional[str], query_key: str) -> list:
     logging.info(f"缓存未命中，正在查询 NeoDB: {query_key}")
     params = {"query": title}
     if media_type:
@@ -75,26 +69,35 @@ async def neodb_search(title: str, media_type: Optional[str] = None):
         "Accept": "application/json",
         "Authorization": f"Bearer {NEODB_ACCESS_TOKEN}"
     }
-    async with aiohttp.ClientSession() as session:
-        async with session.get(NEODB_SEARCH_API, params=params, headers=headers) as resp:
-            text = await resp.text()
-            logging.info(f"📡 HTTP 状态码: {resp.status}")
-            logging.info(f"📝 返回内容: {resp}")
+    # 使用共享的 HTTP 客户端（连接复用、超时与重试）
+    data = await get_json(NEODB_SEARCH_API, params=params, headers=headers)
+    results = data.get("data", [])
 
-            if resp.status != 200:
-                raise Exception(f"NeoDB API 请求失败，状态码: {resp.status}，内容: {text}")
+    # 存入缓存
+    try:
+        logging.info(f"查询成功，正在缓存 neodb 结果：{query_key}")
+        set_neodb_cache(query_key, results)
+    except Exception as e:
+        logging.error(f"❌ 缓存保存失败：{e}")
 
-            data = await resp.json()
-            results = data.get("data", [])
-            
-            # 3. 存入缓存
-            try:
-                logging.info(f"查询成功，正在缓存 neodb 结果：{query_key}")
-                set_neodb_cache(query_key, results)
-            except Exception as e:
-                logging.error(f"❌ 缓存保存失败：{e}")
-            
-            return results
+    return results
+
+async def neodb_search(title: str, media_type: Optional[str] = None):
+    # 创建缓存 key
+    query_key = f"{title.strip().lower()}::{media_type or 'any'}"
+    
+    # 1. 先查缓存
+    cached = get_neodb_cached_result(query_key)
+    if cached:
+        logging.info(f"✅ 命中缓存：{query_key}")
+        return cached
+    
+    # 2. 缓存未命中，发起请求（并发的相同查询只请求一次）
+    return await neodb_loader.get_or_load(
+        query_key,
+        lambda: fetch_neodb(title, media_type, query_key),
+        is_negative=lambda results: not results,
+    )
 
 def build_neodb_embed(item) -> Embed:
     title = item.get("title") or "未知标题"
@@ -237,4 +240,12 @@ def setup(bot: commands.Bot) -> None:
 
         except Exception as e:
             logging.exception("❌ NeoDB 查询失败：")
-            await interaction.followup.send("❌ 查询失败，请稍后再试。", ephemeral=True)
\ No newline at end of file
+            await interaction.followup.send("❌ 查询失败，请稍后再试。", ephemeral=True)
+
+    @neodb.autocomplete("title")
+    async def neodb_title_autocomplete(interaction: Interaction, current: str):
+        # 只从本地缓存的索引中补全，引导用户使用已缓存的查询
+        return [
+            app_commands.Choice(name=title[:100], value=title[:100])
+            for title in suggest_neodb_titles(current)
+        ]
\ No newline at end of file
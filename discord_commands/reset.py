@@ -2,7 +2,7 @@ import discord
 import logging
 from discord.ext import commands
 from discord.ui import View, Button
-from utils.storage import history_storage, summary_storage, role_storage
+from utils.storage import history_storage, summary_storage, summary_watermark_storage, role_storage
 # ============================== #
 # reset 指令
 # ============================== #
@@ -18,6 +18,7 @@ def setup(bot: commands.Bot) -> None:
                 user_id = str(interaction_.user.id)
                 history_storage.delete(user_id)
                 summary_storage.delete(user_id)
+                summary_watermark_storage.delete(user_id)
                 role_storage.delete(user_id)
                 await interaction_.response.edit_message(content="✅ 历史记录已清空 >.<", view=None)
                 logging.info(f"✅ 用户 {user_id} 清空了所有历史")
@@ -1,6 +1,5 @@
 import asyncio
 import logging
-import aiohttp
 import re
 from discord.ext import commands
 from discord import Interaction, Embed, app_commands, Color
@@ -8,6 +7,9 @@ from typing import Optional
 from utils.gpt_call import gpt_call
 from utils.embed import get_random_embed_color
 from utils.constants import DEFAULT_MODEL
+from utils.http_client import get_json
+from utils.async_cache import AsyncCache
+from utils.steam_index import match_steam_app
 
 # ============================== #
 # /steam 指令
@@ -27,6 +29,27 @@ region_choices = [
     app_commands.Choice(name="土区（土耳其里拉）", value="tr"),
     app_commands.Choice(name="阿区（阿根廷比索）", value="ar"),
 ]
+region_names = {choice.value: choice.name for choice in region_choices}
+
+# 比价模式使用的近似汇率（1 单位货币 ≈ 多少美元），只用于排序和粗略比较，不会自动更新
+APPROX_USD_RATES_DATE = "2025-06"  # 汇率取值时间（参考当月市场中间价），更新汇率时一并修改
+APPROX_USD_RATES = {
+    "USD": 1.0,
+    "CNY": 0.14,
+    "JPY": 0.0067,
+    "HKD": 0.128,
+    "TWD": 0.031,
+    "MYR": 0.21,
+    "CAD": 0.73,
+    "EUR": 1.08,
+    "RUB": 0.011,
+    "TRY": 0.03,
+    "ARS": 0.001,
+}
+
+# 比价时同时请求 appdetails 的上限（所有比价请求共享），避免触发 Steam 的频率限制
+STEAM_COMPARE_CONCURRENCY = 4
+_compare_semaphore = asyncio.Semaphore(STEAM_COMPARE_CONCURRENCY)
 
 
 # 1. 让 GPT 返回标准中文和英文游戏名
@@ -66,12 +89,23 @@ async def get_standard_names_by_gpt(game_name: str) -> Optional[tuple]:
 
 
 # 2. 封装 steam storesearch 搜索
-async def steam_fuzzy_search(session, search_name, region_code, lang):
-    search_url = (
-        f"https://store.steampowered.com/api/storesearch/?term={search_name}&cc={region_code}&l={lang}"
+STEAM_SEARCH_API = "https://store.steampowered.com/api/storesearch/"
+STEAM_APPDETAILS_API = "https://store.steampowered.com/api/appdetails"
+
+# storesearch 结果缓存 1 小时，没有结果或请求失败时缓存 5 分钟
+steam_search_cache = AsyncCache(ttl=3600, negative_ttl=300)
+# appdetails（含价格）缓存 30 分钟，获取失败时缓存 1 分钟
+steam_appdetails_cache = AsyncCache(ttl=1800, negative_ttl=60)
+
+async def steam_fuzzy_search(search_name, region_code, lang):
+    return await steam_search_cache.get_or_load(
+        (search_name.strip().lower(), region_code, lang),
+        lambda: _steam_fuzzy_search(search_name, region_code, lang),
+        is_negative=lambda item: item is None,
     )
-    async with session.get(search_url) as resp:
-        data = await resp.json()
+
+async def _steam_fuzzy_search(search_name, region_code, lang):
+    data = await get_json(STEAM_SEARCH_API, params={"term": search_name, "cc": region_code, "l": lang})
 
     items = data.get("items", [])
     if not items:
@@ -93,67 +127,170 @@ async def steam_fuzzy_search(session, search_name, region_code, lang):
     # 3. 回退模糊的第一个
     return items[0]
 
+async def steam_search_first(names, region_code, lang):
+    """并发搜索多个名称变体，返回最先找到的结果，并取消其余请求"""
+    tasks = [
+        asyncio.create_task(steam_fuzzy_search(name, region_code, lang))
+        for name in dict.fromkeys(name for name in names if name)
+    ]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            try:
+                found = await next_done
+            except Exception as e:
+                logging.warning(f"⚠️ Steam 搜索失败：{e}")
+                continue
+            if found:
+                return found
+        return None
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+async def get_app_details(app_id, region_code, lang) -> dict:
+    """获取 appdetails 中的 data；按 (app_id, cc, lang) 缓存，失败时返回空字典"""
+    return await steam_appdetails_cache.get_or_load(
+        (str(app_id), region_code, lang),
+        lambda: _get_app_details(app_id, region_code, lang),
+        is_negative=lambda info: not info,
+    )
+
+async def _get_app_details(app_id, region_code, lang) -> dict:
+    # 使用 Accept-Language 头部来确保获取中文数据
+    headers = {"Accept-Language": "zh-CN"} if lang == "zh" else None
+    data = await get_json(STEAM_APPDETAILS_API, params={"appids": app_id, "cc": region_code, "l": lang}, headers=headers)
+    result = data.get(str(app_id), {})
+    if not result.get("success"):
+        logging.error(f"❗ appdetails 获取失败：{app_id}（{region_code}/{lang}）")
+        return {}
+    return result.get("data", {})
+
+# ============================== #
+# 多地区比价
+# ============================== #
+def parse_compare_regions(text: str) -> list:
+    """解析比价地区：all 或以逗号/空格分隔的地区代码，忽略无效代码"""
+    text = text.strip().lower()
+    if text in ("all", "全部"):
+        return list(region_names)
+    codes = [code for code in re.split(r"[\s,，]+", text) if code in region_names]
+    return list(dict.fromkeys(codes))
+
+async def fetch_region_prices(app_id, region_codes: list) -> dict:
+    """并发获取多个地区的 price_overview（经过 appdetails 缓存），返回 {地区: price_overview 或 None}"""
+    async def fetch(code):
+        async with _compare_semaphore:
+            try:
+                info = await get_app_details(app_id, code, "en")
+            except Exception as e:
+                logging.warning(f"⚠️ 获取 {code} 区价格失败：{e}")
+                return None
+        return info.get("price_overview")
+
+    prices = await asyncio.gather(*(fetch(code) for code in region_codes))
+    return dict(zip(region_codes, prices))
+
+def build_compare_embed(title: str, store_url: str, header: Optional[str], prices: dict) -> Embed:
+    """按折合美元从低到高排列各地区价格"""
+    rows, missing = [], []
+    for code, price_info in prices.items():
+        if not price_info:
+            missing.append(region_names[code])
+            continue
+        currency = price_info["currency"]
+        final = price_info["final"] / 100
+        rate = APPROX_USD_RATES.get(currency)
+        usd = final * rate if rate is not None else None
+        line = f"**{region_names[code]}**：{final:.2f} {currency}"
+        if usd is not None:
+            line += f"（≈ ${usd:.2f}）"
+        if price_info["discount_percent"] > 0:
+            line += f" -{price_info['discount_percent']}%"
+        rows.append((usd is None, usd or 0, line))
+
+    rows.sort()
+    lines = [f"{i}. {line}" for i, (_, _, line) in enumerate(rows, start=1)]
+    if missing:
+        lines.append(f"暂无价格：{', '.join(missing)}")
+
+    embed = Embed(title=f"💰 {title} 多区比价",
+                  description="\n".join(lines) or "免费或暂无价格信息",
+                  color=get_random_embed_color() if rows else Color.default())
+    embed.add_field(name="🔗 商店链接", value=store_url, inline=False)
+    embed.set_footer(text=f"≈ 美元价格按 {APPROX_USD_RATES_DATE} 的固定近似汇率折算，仅用于排序参考，不是实时汇率")
+    if header:
+        embed.set_thumbnail(url=header)
+    return embed
+
 def setup(bot: commands.Bot) -> None:
     @bot.tree.command(name="steam", description="查询 Steam 游戏信息")
-    @app_commands.describe(game_name="游戏名称", region="查询地区（默认国区）")
+    @app_commands.describe(game_name="游戏名称",
+                           region="查询地区（默认国区）",
+                           compare="比价模式：填 all 或多个地区代码，如 cn,us,jp")
     @app_commands.choices(region=region_choices)
     async def steam(interaction: Interaction,
                     game_name: str,
-                    region: Optional[app_commands.Choice[str]] = None):
+                    region: Optional[app_commands.Choice[str]] = None,
+                    compare: Optional[str] = None):
         await interaction.response.defer()
 
+        compare_regions = parse_compare_regions(compare) if compare else []
+        if compare and not compare_regions:
+            await interaction.followup.send(
+                f"❌ 无效的地区代码，可选：all 或 {', '.join(region_names)}", ephemeral=True)
+            return
+
         region_code = region.value if region else "cn"
         region_display = region.name if region else "国区（人民币）"
 
-        # 1. GPT 标准化游戏名
-        names = await get_standard_names_by_gpt(game_name)
-        if not names:
-            await interaction.followup.send("❌ 未能标准化游戏名，请检查输入。", ephemeral=True)
-            return
-        zh_name, en_name = names
-
-        # 2. 依次用"中文名-英文名-原始名"去 Steam 搜索（优先中文）
-        async with aiohttp.ClientSession() as session:
-            found = None
-            app_id = None
-            for try_name in [zh_name, en_name, game_name]:
-                if not try_name:
-                    continue
-                found = await steam_fuzzy_search(session, try_name, region_code,
-                                                "zh")
-                if found:
-                    app_id = found["id"]
-                    break
-
-            if not app_id:
-                await interaction.followup.send("❌ Steam商店未找到匹配的游戏，请检查输入。", ephemeral=True)
+        # 1. 先查本地应用索引，有把握时跳过 GPT 和商店搜索
+        app_id = None
+        match = match_steam_app(game_name)
+        if match:
+            app_id, matched_name, score = match
+            zh_name, en_name = None, matched_name
+            names = (zh_name, en_name)
+            logging.info(f"✅ 本地索引命中：{matched_name}（{app_id}，相似度 {score:.2f}）")
+        else:
+            # 2. GPT 标准化游戏名
+            names = await get_standard_names_by_gpt(game_name)
+            if not names:
+                await interaction.followup.send("❌ 未能标准化游戏名，请检查输入。", ephemeral=True)
                 return
+            zh_name, en_name = names
+
+            # 3. 同时用"中文名-英文名-原始名"去 Steam 搜索，先找到的为准
+            found = await steam_search_first([zh_name, en_name, game_name], region_code, "zh")
+            if found:
+                app_id = found["id"]
+
+        if not app_id:
+            await interaction.followup.send("❌ Steam商店未找到匹配的游戏，请检查输入。", ephemeral=True)
+            return
+
+        store_url = f"https://store.steampowered.com/app/{app_id}"
+
+        # 比价模式：游戏只解析一次，再并发获取各地区价格
+        if compare_regions:
+            logging.info(f"💰 多区比价：{app_id}（{', '.join(compare_regions)}）")
+            zh_info, prices = await asyncio.gather(
+                get_app_details(app_id, "cn", "zh"),
+                fetch_region_prices(app_id, compare_regions),
+            )
+            title = zh_info.get("name") or zh_name or en_name or game_name
+            await interaction.followup.send(
+                embed=build_compare_embed(title, store_url, zh_info.get("header_image"), prices))
+            return
 
-            # 3. 获取游戏详情，默认cn
-            zh_url = f"https://store.steampowered.com/api/appdetails?appids={app_id}&cc=cn&l=zh"
-            en_url = f"https://store.steampowered.com/api/appdetails?appids={app_id}&cc={region_code}&l=en"
-            logging.info(f"🔍 正在搜索游戏：{names}")
-            logging.info(f"🔗 搜索链接：{zh_url}")
-            logging.info(f"🔗 备用链接：{en_url}")
-
-            # 使用 Accept-Language 头部来确保获取中文数据
-            headers = {"Accept-Language": "zh-CN"}
-            zh_resp, en_resp = await asyncio.gather(session.get(zh_url, headers=headers),
-                                                    session.get(en_url))
-
-            zh_data = await zh_resp.json()
-            en_data = await en_resp.json()
-            #logging.debug("debug用zh_data\n", zh_data)
-
-        app_id = str(app_id)
-        zh_info = zh_data.get(str(app_id), {}).get("data", {}) if zh_data.get(
-            str(app_id), {}).get("success") else {}
-        en_info = en_data.get(str(app_id), {}).get("data", {}) if en_data.get(
-            str(app_id), {}).get("success") else {}
-        if not zh_data.get(str(app_id), {}).get("success"):
-            logging.error("❗ 中文 API 获取失败")
-        if not en_data.get(str(app_id), {}).get("success"):
-            logging.error("❗ 英文 API 获取失败")
+        # 3. 获取游戏详情，默认cn
+        logging.info(f"🔍 正在搜索游戏：{names}")
+        logging.info(f"🔗 appdetails：{app_id}（cn/zh，{region_code}/en）")
+
+        zh_info, en_info = await asyncio.gather(
+            get_app_details(app_id, "cn", "zh"),
+            get_app_details(app_id, region_code, "en"),
+        )
 
         # 4. 构建 Embed 优先中文
         display_zh_name = zh_info.get("name") or zh_name or "未知游戏"
@@ -165,7 +302,6 @@ def setup(bot: commands.Bot) -> None:
         logging.info(f"✅ en short_description: {en_info.get('short_description')}")
         
         header = zh_info.get("header_image") or en_info.get("header_image")
-        store_url = f"https://store.steampowered.com/app/{app_id}"
         price_info = en_info.get("price_overview") or zh_info.get("price_overview")
 
         logging.info(f"🎮 游戏名称：{display_zh_name} / {display_en_name}")
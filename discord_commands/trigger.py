@@ -2,8 +2,12 @@ import discord
 import logging
 from discord.ext import commands
 from discord import app_commands
-from utils.storage import trigger_storage
-from events.trigger_events import load_triggers_off, save_triggers_off, disabled_triggers
+from typing import Optional
+from utils.constants import OWNER_ID
+from events.trigger_events import save_triggers_off, disabled_triggers, get_trigger_words, set_trigger_words, DEFAULT_TRIGGER_WORDS
+
+MAX_TRIGGER_WORDS = 20  # 每个服务器最多的触发词数
+MAX_TRIGGER_WORD_LENGTH = 32
 
 # ============================== #
 # /trigger 指令
@@ -28,4 +32,62 @@ def setup(bot: commands.Bot) -> None:
                 save_triggers_off()
             await interaction.response.send_message("😮 已开启自动触发`咋办` >.<", ephemeral=True)
         
-        logging.info(f"🛠 用户 {user_id} 设置触发状态为 {mode.value}")
\ No newline at end of file
+        logging.info(f"🛠 用户 {user_id} 设置触发状态为 {mode.value}")
+
+# ============================== #
+# /triggerword 指令
+# ============================== #
+def setup_triggerword(bot: commands.Bot) -> None:
+    @bot.tree.command(name="triggerword", description="管理本服务器的自动触发词")
+    @app_commands.describe(action="操作", word="触发词（添加/删除时填写）")
+    @app_commands.choices(action=[
+        app_commands.Choice(name="查看 / list", value="list"),
+        app_commands.Choice(name="添加 / add", value="add"),
+        app_commands.Choice(name="删除 / remove", value="remove"),
+        app_commands.Choice(name="恢复默认 / reset", value="reset"),
+    ])
+    async def triggerword(interaction: discord.Interaction, action: app_commands.Choice[str], word: Optional[str] = None):
+        if interaction.guild is None:
+            await interaction.response.send_message("ℹ️ 这个命令只能在服务器中使用哦", ephemeral=True)
+            return
+
+        guild_id = str(interaction.guild.id)
+        words = list(get_trigger_words(guild_id))
+
+        if action.value == "list":
+            text = "、".join(f"`{w}`" for w in words) or "（无）"
+            await interaction.response.send_message(f"📋 本服务器的触发词：{text}", ephemeral=True)
+            return
+
+        # 权限检查
+        if interaction.user.id != OWNER_ID and not interaction.user.guild_permissions.manage_guild:
+            await interaction.response.send_message("ℹ️ 你没有权限使用这个命令哦 :3c", ephemeral=True)
+            return
+
+        word = (word or "").strip()
+        if action.value == "reset":
+            words = list(DEFAULT_TRIGGER_WORDS)
+            message = "✅ 已恢复默认触发词"
+        elif not word:
+            await interaction.response.send_message("❌ 请填写触发词", ephemeral=True)
+            return
+        elif action.value == "add":
+            if word in words:
+                await interaction.response.send_message(f"ℹ️ `{word}` 已经是触发词了", ephemeral=True)
+                return
+            if len(word) > MAX_TRIGGER_WORD_LENGTH or len(words) >= MAX_TRIGGER_WORDS:
+                await interaction.response.send_message(
+                    f"❌ 触发词最长 {MAX_TRIGGER_WORD_LENGTH} 个字，每个服务器最多 {MAX_TRIGGER_WORDS} 个", ephemeral=True)
+                return
+            words.append(word)
+            message = f"✅ 已添加触发词 `{word}`"
+        else:
+            if word not in words:
+                await interaction.response.send_message(f"ℹ️ `{word}` 不是触发词", ephemeral=True)
+                return
+            words.remove(word)
+            message = f"✅ 已删除触发词 `{word}`"
+
+        set_trigger_words(guild_id, words)
+        await interaction.response.send_message(message, ephemeral=True)
+        logging.info(f"🛠 用户 {interaction.user.id} 在服务器 {guild_id} {action.value} 触发词：{word}")
\ No newline at end of file
@@ -1,8 +1,49 @@
+import os
+import json
+import hashlib
 import logging
 import discord
 from discord.ext import commands
 from utils.constants import status_map, activity_map
-from utils.storage import status_storage
+from utils.storage import status_storage, command_sync_storage
+
+# 设置后每次启动都强制同步指令
+FORCE_COMMAND_SYNC = bool(os.environ.get("FORCE_COMMAND_SYNC"))
+
+# 本进程内是否已经检查过指令同步（重连时 on_ready 会再次触发）
+_tree_checked = False
+
+# ============================== #
+# 指令树签名
+# ============================== #
+def get_command_tree_hash(bot: commands.Bot) -> str:
+    """对已注册指令的完整定义（名称、描述、参数、选项等）计算稳定的哈希"""
+    payload = []
+    for cmd in sorted(bot.tree.get_commands(), key=lambda c: c.name):
+        try:
+            payload.append(cmd.to_dict(bot.tree))  # discord.py 2.4 起需要传入 tree
+        except TypeError:
+            payload.append(cmd.to_dict())
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+async def sync_command_tree_if_changed(bot: commands.Bot):
+    """只在指令定义变化时同步全局指令，签名按 application id 保存"""
+    global _tree_checked
+    if _tree_checked:
+        logging.info("✅ 重新连接，跳过指令同步")
+        return
+
+    tree_hash = get_command_tree_hash(bot)
+    key = str(bot.application_id)
+    if not FORCE_COMMAND_SYNC and command_sync_storage.get(key) == tree_hash:
+        logging.info("✅ 指令定义未变化，跳过同步")
+    else:
+        synced = await bot.tree.sync()
+        command_sync_storage.set(key, tree_hash)
+        logging.info(f"✅ Slash commands synced: {len(synced)} 个全局指令已注册")
+    _tree_checked = True
+
 # ============================== #
 # bot 启动event
 # ============================== #
@@ -39,10 +80,8 @@ def setup(bot: commands.Bot):
         # 设置状态
         await bot.change_presence(status=bot_status, activity=activity)
             
-        # 同步全局命令
-        synced = await bot.tree.sync()
-            
-        logging.info(f"✅ Slash commands synced: {len(synced)} 个全局指令已注册")
+        # 同步全局命令（指令定义没有变化时跳过）
+        await sync_command_tree_if_changed(bot)
             
         # 打印所有已注册的指令名称
         command_names = [cmd.name for cmd in bot.tree.get_commands()]
@@ -4,99 +4,89 @@ from datetime import datetime
 import discord
 from discord.ext import commands
 from utils.storage import guild_list_storage
+from utils.throttler import send_message
 
 LOG_CHANNEL_ID = 1120505368531976244
+JST = pytz.timezone("Asia/Tokyo")
 
-# 加入新服务器触发日志提醒
-def update_guilds_json(bot: commands.Bot):
-    data = [
-        {
-            "id": g.id,
-            "name": g.name,
-            "member_count": g.member_count,
-            "owner_id": g.owner_id,
-            "joined_at": datetime.now(pytz.timezone("Asia/Tokyo")).strftime("%Y-%m-%d %H:%M:%S %Z")
-        } for g in bot.guilds
-    ]
-    existing = guild_list_storage.get("guilds", []) or []
-    if not isinstance(existing, list):
-        existing = []
-    merged = {str(g["id"]): g for g in existing}  # 用 dict 合并，防重复
-    
-    for g in bot.guilds:
-        merged[str(g.id)] = {
-            "id": g.id,
-            "name": g.name,
-            "member_count": g.member_count,
-            "owner_id": g.owner_id,
-            "joined_at": datetime.now(pytz.timezone("Asia/Tokyo")).strftime("%Y-%m-%d %H:%M:%S %Z")
-        }
+def _now_jst() -> str:
+    return datetime.now(JST).strftime("%Y-%m-%d %H:%M:%S %Z")
 
-    guild_list_storage.set("guilds", list(merged.values()))
+# 服务器登记表：{guild_id: {...}}
+def _get_guild_registry() -> dict:
+    guilds = guild_list_storage.get("guilds", {}) or {}
+    if isinstance(guilds, list):
+        # 旧格式为列表，迁移为以 id 为 key 的字典
+        guilds = {str(g["id"]): g for g in guilds if isinstance(g, dict) and "id" in g}
+    elif not isinstance(guilds, dict):
+        guilds = {}
+    guild_list_storage.data["guilds"] = guilds
+    return guilds
 
-def setup_guild_event_handlers(bot: commands.Bot):
-    @bot.event
-    async def on_guild_join(guild):
-        update_guilds_json(bot)
-        
-        log_channel = bot.get_channel(LOG_CHANNEL_ID) 
-        jst = pytz.timezone("Asia/Tokyo")
-        joined_time = datetime.now(jst).strftime("%Y-%m-%d %H:%M:%S %Z")
-        
-        if not isinstance(log_channel, (discord.TextChannel, discord.Thread)):
-            logging.warning("⚠️ log_channel 不是文本频道，无法发送消息")
-            return
+# 只更新发生变化的服务器
+def update_guild_registry(guild: discord.Guild, event_time: str, removed: bool = False):
+    guilds = _get_guild_registry()
+    entry = guilds.get(str(guild.id), {})
+    entry.update({
+        "id": guild.id,
+        "name": guild.name,
+        "member_count": guild.member_count,
+        "owner_id": guild.owner_id,
+    })
+    if removed:
+        entry["removed_at"] = event_time
+    else:
+        entry["joined_at"] = event_time
+        entry.pop("removed_at", None)
+    guilds[str(guild.id)] = entry
+    # write-behind：只标记为脏，由后台 flusher 合并写入
+    guild_list_storage.save()
 
-        try:
-            owner = await bot.fetch_user(guild.owner_id)
-        except Exception as e:
-            owner = f"未知（获取失败: {e}）"
+# 优先使用缓存中的用户，找不到时才请求 API
+async def get_guild_owner(bot: commands.Bot, guild: discord.Guild):
+    owner = guild.owner or bot.get_user(guild.owner_id)
+    if owner:
+        return owner
+    try:
+        return await bot.fetch_user(guild.owner_id)
+    except Exception as e:
+        return f"未知（获取失败: {e}）"
 
-        message = (
-            f"✅ Bot 加入了新服务器：**{guild.name}**（ID: `{guild.id}`）\n"
-            f"👥 拥有者：{owner}（ID: {guild.owner_id}）\n"
-            f"👥 成员数：{guild.member_count}\n"
-            f"🕒 加入时间：{joined_time}"
-        )
+# 加入/移除服务器触发日志提醒
+async def report_guild_event(bot: commands.Bot, guild: discord.Guild, removed: bool):
+    event_time = _now_jst()
+    update_guild_registry(guild, event_time, removed=removed)
 
-        await log_channel.send(message)
+    log_channel = bot.get_channel(LOG_CHANNEL_ID)
+    if not isinstance(log_channel, (discord.TextChannel, discord.Thread)):
+        logging.warning("⚠️ log_channel 不是文本频道，无法发送消息")
+        return
 
-        logging.info(f"✅ Bot 加入新服务器：{guild.name}（ID: {guild.id}）")
-        logging.info(f"👥 拥有者：{owner}（ID: {guild.owner_id}）")
-        logging.info(f"👥 成员数：{guild.member_count}")
-        logging.info(f"🕒 加入时间：{joined_time}")
-        for each_guild in bot.guilds:
-            logging.info(f"📋 服务器名：{each_guild.name} 成员数：{each_guild.member_count}")
+    owner = await get_guild_owner(bot, guild)
+    if removed:
+        title = f"❌ Bot 被移除了服务器：**{guild.name}**（ID: `{guild.id}`）"
+        time_line = f"🕒 移除时间：{event_time}"
+    else:
+        title = f"✅ Bot 加入了新服务器：**{guild.name}**（ID: `{guild.id}`）"
+        time_line = f"🕒 加入时间：{event_time}"
 
-    @bot.event
-    async def on_guild_remove(guild):
-        update_guilds_json(bot) 
+    message = (
+        f"{title}\n"
+        f"👥 拥有者：{owner}（ID: {guild.owner_id}）\n"
+        f"👥 成员数：{guild.member_count}\n"
+        f"{time_line}"
+    )
 
-        log_channel = bot.get_channel(LOG_CHANNEL_ID)
-        jst = pytz.timezone("Asia/Tokyo")
-        removed_time = datetime.now(jst).strftime("%Y-%m-%d %H:%M:%S %Z")
-        
-        if not isinstance(log_channel, (discord.TextChannel, discord.Thread)):
-            logging.warning("⚠️ log_channel 不是文本频道，无法发送消息")
-            return
+    await send_message(log_channel, message)
 
-        try:
-            owner = await bot.fetch_user(guild.owner_id)
-        except Exception as e:
-            owner = f"未知（获取失败: {e}）"
-        
-        message = (
-            f"❌ Bot 被移除了服务器：**{guild.name}**（ID: `{guild.id}`）\n"
-            f"👥 拥有者：{owner}（ID: {guild.owner_id}）\n"
-            f"👥 成员数：{guild.member_count}\n"
-            f"🕒 移除时间：{removed_time}"
-        )
+    logging.info(message.replace("**", "").replace("`", ""))
+    logging.info(f"📋 当前共加入了 {len(bot.guilds)} 个服务器")
 
-        await log_channel.send(message)
+def setup_guild_event_handlers(bot: commands.Bot):
+    @bot.event
+    async def on_guild_join(guild):
+        await report_guild_event(bot, guild, removed=False)
 
-        logging.info(f"❌ Bot 被移除了服务器：{guild.name}（ID: {guild.id}）")
-        logging.info(f"👥 拥有者：{owner}（ID: {guild.owner_id}）")
-        logging.info(f"👥 成员数：{guild.member_count}")
-        logging.info(f"🕒 移除时间：{removed_time}")
-        for each_guild in bot.guilds:
-            logging.info(f"📋 服务器名：{each_guild.name} 成员数：{each_guild.member_count}")
\ No newline at end of file
+    @bot.event
+    async def on_guild_remove(guild):
+        await report_guild_event(bot, guild, removed=True)
@@ -1,21 +1,49 @@
+import re
 from discord.ext import commands
-from utils.storage import trigger_storage
+from typing import Optional
+from utils.storage import trigger_storage, trigger_word_storage
+from utils.throttler import send_auto_reply
 
 # ============================== #
 # 聊天记录中trigger咋办
 # ============================== #
+DEFAULT_TRIGGER_WORDS = ["咋办"]  # 未单独设置的服务器和私聊使用的触发词
+
 disabled_triggers: set[str] = set()
 
-# 加载triggers设置的函数
+# 每个服务器的触发词编译成一个正则：{guild_id: Pattern 或 None}
+_trigger_patterns: dict[Optional[str], Optional[re.Pattern]] = {}
+
+# 加载triggers设置的函数（原地更新，其他模块导入的引用保持有效）
 def load_triggers_off():
-    global disabled_triggers
-    disabled_triggers = set(trigger_storage.data)
+    disabled_triggers.clear()
+    disabled_triggers.update(trigger_storage.data)
             
 # 保存triggers_off设置的函数
 def save_triggers_off():
     trigger_storage.data = list(disabled_triggers)
     trigger_storage.save()
 
+# 触发词设置
+def get_trigger_words(guild_id: Optional[str]) -> list:
+    if guild_id is None:
+        return DEFAULT_TRIGGER_WORDS
+    return trigger_word_storage.get(guild_id, DEFAULT_TRIGGER_WORDS)
+
+def set_trigger_words(guild_id: str, words: list):
+    trigger_word_storage.set(guild_id, words)
+    _trigger_patterns.pop(guild_id, None)
+
+def compile_trigger_words(words: list) -> Optional[re.Pattern]:
+    # 长词优先，避免短词抢先匹配
+    words = sorted({word for word in words if word}, key=len, reverse=True)
+    return re.compile("|".join(map(re.escape, words))) if words else None
+
+def get_trigger_pattern(guild_id: Optional[str]) -> Optional[re.Pattern]:
+    if guild_id not in _trigger_patterns:
+        _trigger_patterns[guild_id] = compile_trigger_words(get_trigger_words(guild_id))
+    return _trigger_patterns[guild_id]
+
 def setup(bot: commands.Bot):
     @bot.event
     async def on_message(message):
@@ -23,9 +51,12 @@ def setup(bot: commands.Bot):
         if message.author.bot:
             return
 
-        user_id = str(message.author.id)
-        if "咋办" in message.content and user_id not in disabled_triggers: # 跳过triggers_off用户
-            await message.channel.send("咋办")
+        pattern = get_trigger_pattern(str(message.guild.id) if message.guild else None)
+        match = pattern.search(message.content) if pattern else None
+        if match and str(message.author.id) not in disabled_triggers: # 跳过triggers_off用户
+            # 经过频道限流与去重，刷屏时不会连发触发 429
+            await send_auto_reply(message.channel, match.group(0))
 
-        # 为了确保其他指令还能运行
-        await bot.process_commands(message)
\ No newline at end of file
+        # 只有注册了前缀指令时才需要解析，否则每条消息都白跑一遍
+        if bot.all_commands:
+            await bot.process_commands(message)
\ No newline at end of file
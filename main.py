@@ -2,6 +2,7 @@
 # 模块导入与初始化
 # ============================== #
 import os
+import asyncio
 import discord
 import logging
 from discord.ext import commands
@@ -11,7 +12,13 @@ import events
 from events.trigger_events import load_triggers_off
 from utils.save_and_load import load_histories, load_summaries, load_roles
 from utils.neodb import load_neodb_cache
-from utils.reddit import load_reddit_cache, load_reddit_sent_cache
+from utils.reddit import load_reddit_cache, load_reddit_sent_cache, start_reddit_client, close_reddit_client, run_reddit_prefetcher
+from utils.translation_cache import load_translation_cache
+from utils.steam_index import run_steam_index_refresher
+from utils.storage import run_storage_flusher, flush_all_storages
+from utils.gpt_call import close_gpt_client
+from utils.http_client import start_http_client, close_http_client
+from utils.auto_summary import start_summary_workers, stop_summary_workers
 
 
 # 初始化写入日志
@@ -30,11 +37,46 @@ if not TOKEN:
     raise ValueError(
         "环境变量未设置，请设置 DISCORD_TOKEN")
 
+# ============================== #
+# Bot 生命周期
+# ============================== #
+class EchosBot(commands.Bot):
+    background_tasks: list[asyncio.Task] = []
+
+    async def setup_hook(self):
+        # 启动后台摘要队列
+        start_summary_workers()
+        # 创建共享的 HTTP 客户端
+        await start_http_client()
+        # 创建共享的 Reddit 客户端
+        await start_reddit_client()
+        self.background_tasks = [
+            # 合并写入 write-behind 存储
+            asyncio.create_task(run_storage_flusher()),
+            # 在过期前刷新 Reddit 缓存
+            asyncio.create_task(run_reddit_prefetcher()),
+            # 加载并定期刷新本地 Steam 应用索引
+            asyncio.create_task(run_steam_index_refresher()),
+        ]
+
+    async def close(self):
+        await super().close()
+        for task in self.background_tasks:
+            task.cancel()
+        # 等后台任务真正结束（flusher 可能正在写文件），再做最后一次刷盘
+        await asyncio.gather(*self.background_tasks, return_exceptions=True)
+        stop_summary_workers()
+        await close_gpt_client()
+        await close_http_client()
+        await close_reddit_client()
+        # 关闭时强制写入所有未保存的数据
+        flush_all_storages()
+
 # 初始化 Discord bot
 intents = discord.Intents.default()
 intents.message_content = True 
 intents.members = True 
-bot = commands.Bot(command_prefix="!", intents=intents)
+bot = EchosBot(command_prefix="!", intents=intents, help_command=None)  # 只使用斜杠指令
 logging.info(f"✅ 使用 discord.py 版本：{discord.__version__}")
 
 
@@ -53,6 +95,7 @@ def main():
         load_reddit_cache()
         load_reddit_sent_cache()
         load_neodb_cache()
+        load_translation_cache()
 
         logging.info("✅ 所有模块已成功加载。")
         logging.info("🔄Bot 正在启动...")
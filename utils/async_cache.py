@@ -0,0 +1,92 @@
+"""
+通用的异步缓存：TTL、负缓存以及 single-flight（并发的相同请求只会调用一次上游）。
+"""
+
+import time
+import asyncio
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+__all__ = ["AsyncCache"]
+
+
+class AsyncCache:
+    """带 TTL、负缓存和 single-flight 加载的异步缓存
+
+    - ttl：正常结果的缓存时间（秒），为 0 时只合并并发请求、不缓存结果
+    - negative_ttl：异常以及 is_negative 判定为“空”的结果的缓存时间（秒）
+    - maxsize：最多缓存的条目数，超出时淘汰最久未使用的
+    """
+
+    def __init__(self, ttl: float, negative_ttl: float = 0, maxsize: int = 1024):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.maxsize = maxsize
+        # {key: (过期时间, 结果, 异常)}
+        self._entries: OrderedDict = OrderedDict()
+        self._inflight: dict[Hashable, asyncio.Future] = {}
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0}
+
+    def _store(self, key: Hashable, ttl: float, value: Any = None, error: Optional[BaseException] = None):
+        if ttl <= 0:
+            return
+        self._entries[key] = (time.monotonic() + ttl, value, error)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    async def get_or_load(
+        self,
+        key: Hashable,
+        loader: Callable[[], Awaitable[Any]],
+        is_negative: Optional[Callable[[Any], bool]] = None,
+    ) -> Any:
+        """命中缓存直接返回；否则调用 loader，同一 key 的并发调用共享同一次加载"""
+        entry = self._entries.get(key)
+        if entry:
+            expires_at, value, error = entry
+            if expires_at > time.monotonic():
+                self.stats["hits"] += 1
+                self._entries.move_to_end(key)
+                if error is not None:
+                    raise error
+                return value
+            del self._entries[key]
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.stats["coalesced"] += 1
+            try:
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                # 发起加载的调用被取消时，由当前调用重新加载
+                if not inflight.cancelled():
+                    raise
+                return await self.get_or_load(key, loader, is_negative)
+
+        self.stats["misses"] += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await loader()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            self._store(key, self.negative_ttl, error=e)
+            future.set_exception(e)
+            future.exception()  # 标记为已读取，避免没有等待者时的警告
+            raise
+        else:
+            ttl = self.negative_ttl if is_negative and is_negative(value) else self.ttl
+            self._store(key, ttl, value=value)
+            future.set_result(value)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    def invalidate(self, key: Hashable):
+        self._entries.pop(key, None)
+
+    def get_stats(self) -> dict:
+        return {**self.stats, "size": len(self._entries), "inflight": len(self._inflight)}
@@ -1,75 +1,158 @@
 import os
 import asyncio
 import logging
+from typing import Optional
 from utils.gpt_call import gpt_call
-from utils.storage import DictStorageManager
-from utils.save_and_load import save_summaries
+from utils.locks import get_user_lock
+from utils.storage import history_storage, summary_storage, summary_watermark_storage, get_list_storage, SAVEDATA_DIR
 from utils.constants import DEFAULT_MODEL
 
 # ============================== #
 # 全局变量与常量定义
 # ============================== #
-SAVEDATA_DIR = "savedata"
+SUMMARY_WORKERS = 2  # 同时进行的摘要任务数量
+SUMMARY_KEEP_RECENT = 10  # 摘要后保留的最近对话条数
 
-# 使用StorageManager封装
-history_storage = DictStorageManager(os.path.join(SAVEDATA_DIR, "histories.json"))
-summary_storage = DictStorageManager(os.path.join(SAVEDATA_DIR, "summaries.json"))
+# 待处理的摘要任务（持久化，重启后继续处理）
+summary_queue_storage = get_list_storage(os.path.join(SAVEDATA_DIR, "summary_queue.json"))
 
-user_histories = history_storage.data  # 存储用户对话历史
-user_summaries = summary_storage.data  # 存储用户对话摘要
+_summary_queue: Optional[asyncio.Queue] = None
+_pending_summaries: set[str] = set(summary_queue_storage.data)
+_summary_workers: list[asyncio.Task] = []
 
 # ============================== #
 # 自动摘要逻辑
 # ============================== #
-async def summarize_history(user_id: str):
-    """为指定用户生成对话摘要"""
-    history = history_storage.data.setdefault(user_id, [])
+SUMMARY_SYSTEM_PROMPT = "请你在1000字以内总结用户和GPT之间从头到尾的所有历史对话，用于后续对话的 context 使用。如果提供了已有摘要，请在已有摘要的基础上结合新增对话进行更新，保留仍然有效的信息。请使用第三人称、概括性语言，不要重复原话，不要加入评论或判断。重点总结用户的行为特征、情绪倾向、风格偏好和主要话题。\n"
+
+
+def build_summary_prompt(previous_summary: str, new_messages: list) -> list:
+    """只发送已有摘要和摘要水位之后的新对话"""
+    history_text = "\n".join([
+        f"User：{msg['content']}\n" if msg["role"] == "user" else f"Assistant：{msg['content']}\n"
+        for msg in new_messages if msg["role"] in ["user", "assistant"]
+    ])
+
+    content = f"以下是新增的对话历史：\n\n{history_text}"
+    if previous_summary:
+        content = f"以下是已有的对话摘要：\n\n{previous_summary}\n\n{content}"
+
+    return [
+        {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+        {"role": "user", "content": content},
+    ]
+
+
+async def update_summary(user_id: str, trim: bool = True, max_tokens: int = 500) -> Optional[str]:
+    """增量更新指定用户的摘要，返回新摘要；没有新对话时返回现有摘要
+
+    trim 为 True 时会清除已摘要的早期对话，只保留最近 SUMMARY_KEEP_RECENT 条。
+    失败时抛出异常。
+    """
+    # 对当前历史做快照，生成摘要期间用户可以继续对话
+    history = list(history_storage.data.get(user_id, []))
     if not history:
-        return
+        return None
+
+    watermark = min(summary_watermark_storage.get(user_id, 0), len(history))
+    new_messages = history[watermark:]
+    previous_summary = summary_storage.get(user_id, "")
+    if not new_messages:
+        return previous_summary
+
+    logging.info(f"正在为用户 {user_id} 生成摘要...")
+    logging.info(f"摘要开始前的历史内容：{len(history)}，其中新增：{len(new_messages)}")
+
+    summary_response = await gpt_call(
+        model=DEFAULT_MODEL,
+        messages=build_summary_prompt(previous_summary, new_messages),
+        temperature=0.3,
+        max_tokens=max_tokens,
+        timeout=60,
+    )
+
+    choices = summary_response.choices or []
+    if not choices or not choices[0].message.content:
+        raise ValueError("GPT 没有返回摘要内容")
+    summary_text = choices[0].message.content.strip()
+
+    logging.info(f"摘要成功：{summary_text}")
+
+    # 在用户锁内一次性写入摘要、水位并清理历史
+    async with get_user_lock(user_id):
+        current = history_storage.data.get(user_id, [])
+        if len(current) < len(history):
+            logging.info(f"ℹ️ 用户 {user_id} 的历史在摘要期间被重置，放弃本次摘要")
+            return None
 
-    try:
-        logging.info(f"正在为用户 {user_id} 生成摘要...")
-        logging.info(f"摘要开始前的历史内容：{len(history_storage.data[user_id])}")
-        
-        history_text = "\n".join([
-            f"User：{msg['content']}\n" if msg["role"] == "user" else f"Assistant：{msg['content']}\n"
-            for msg in history if msg["role"] in ["user", "assistant"]
-        ])
-
-        summary_prompt = [
-            {
-            "role":
-            "system",
-            "content":
-            "请你在1000字以内总结用户和GPT之间从头到尾的所有历史对话，用于后续对话的 context 使用。请使用第三人称、概括性语言，不要重复原话，不要加入评论或判断。重点总结用户的行为特征、情绪倾向、风格偏好和主要话题。\n"
-            },
-            {
-            "role": "user",
-            "content": f"以下是完整的对话历史：\n\n{history_text}"
-            }
-        ]
-
-        summary_response = await gpt_call(
-            model=DEFAULT_MODEL,
-            messages=summary_prompt,
-            temperature=0.3,
-            max_tokens=500,
-            timeout=60,
-        )
-
-        summary_text = summary_response.choices[0].message.content or ""
-        
-        logging.info(f"摘要成功：{summary_text}")
-        
         summary_storage.data[user_id] = summary_text
-        await asyncio.to_thread(summary_storage.save)
-        logging.info(f"✅ 用户 {user_id} 摘要完成")
+        summary_storage.save()
 
-        # 清除早期对话，只保留最后 10 条
-        history_storage.data[user_id] = history_storage.data[user_id][-10:]
-        await asyncio.to_thread(history_storage.save)
+        if trim:
+            # 清除已摘要的早期对话，只保留快照中最后 10 条以及摘要期间的新对话
+            trim_start = max(0, len(history) - SUMMARY_KEEP_RECENT)
+            history_storage.data[user_id] = current[trim_start:]
+            history_storage.save()
+        else:
+            trim_start = 0
 
-        logging.info(f"用户 {user_id} 的历史已清理，仅保留最近 {len(history_storage.data[user_id])} 条对话")
+        # 水位：当前历史中已包含在摘要里的条数
+        summary_watermark_storage.data[user_id] = len(history) - trim_start
+        summary_watermark_storage.save()
 
+    logging.info(f"✅ 用户 {user_id} 摘要完成，当前保留 {len(history_storage.data[user_id])} 条对话")
+    return summary_text
+
+
+async def summarize_history(user_id: str):
+    """为指定用户生成对话摘要（后台任务使用，失败只记录日志）"""
+    try:
+        await update_summary(user_id)
     except Exception as e:
-        logging.warning(f"⚠️ 为用户 {user_id} 生成摘要失败：{e}")
\ No newline at end of file
+        logging.warning(f"⚠️ 为用户 {user_id} 生成摘要失败：{e}")
+
+# ============================== #
+# 后台摘要队列
+# ============================== #
+def enqueue_summary(user_id: str) -> bool:
+    """把摘要任务加入后台队列；同一用户已在队列中时不重复加入"""
+    if user_id in _pending_summaries:
+        return False
+
+    _pending_summaries.add(user_id)
+    summary_queue_storage.append(user_id)
+    if _summary_queue is not None:
+        _summary_queue.put_nowait(user_id)
+    logging.info(f"📝 用户 {user_id} 的摘要任务已加入队列")
+    return True
+
+
+async def _summary_worker():
+    assert _summary_queue is not None
+    while True:
+        user_id = await _summary_queue.get()
+        # 被取消（关闭 bot）时任务仍保留在文件中，下次启动继续处理
+        await summarize_history(user_id)
+        _pending_summaries.discard(user_id)
+        summary_queue_storage.remove(user_id)
+        _summary_queue.task_done()
+
+
+def start_summary_workers(workers: int = SUMMARY_WORKERS):
+    """启动后台摘要 worker，并恢复上次未完成的任务"""
+    global _summary_queue
+    _summary_queue = asyncio.Queue()
+    for user_id in summary_queue_storage.data:
+        _summary_queue.put_nowait(user_id)
+    if summary_queue_storage.data:
+        logging.info(f"📝 恢复了 {len(summary_queue_storage.data)} 个未完成的摘要任务")
+
+    for _ in range(workers):
+        _summary_workers.append(asyncio.create_task(_summary_worker()))
+
+
+def stop_summary_workers():
+    """停止后台摘要 worker（未完成的任务保留在文件中）"""
+    for task in _summary_workers:
+        task.cancel()
+    _summary_workers.clear()
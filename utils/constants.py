@@ -2,9 +2,12 @@ import discord
 # ============================== #
 # 全局变量与常量定义
 # ============================== #
-MAX_HISTORY = 50  # 最多保留最近 50 条消息（user+assistant 各算一条）
+CONTEXT_TOKEN_BUDGET = 6000  # /ask 上下文（system prompt + 角色 + 摘要 + 历史）的 token 上限
 SUMMARY_TRIGGER = 30  # 当历史记录超过 30 条消息时，自动进行总结
 DEFAULT_MODEL = "gpt-4.1"
+ASK_STREAMING = True  # /ask 是否流式输出回复
+STREAM_EDIT_INTERVAL = 1.5  # 流式输出时编辑消息的最小间隔，单位为秒（避免触发 Discord 限流）
+DISCORD_MESSAGE_LIMIT = 2000  # Discord 单条消息的最大字符数
 
 # 默认 System Prompt
 DEFAULT_SYSTEM_PROMPT = "你是一个温柔、聪明、擅长倾听的 AI 小助手，名字是咋办。\n请你认真回答用户的问题。默认用户都为女性，使用女性代称，性别优先词为她、她们，不使用女性歧视的词语，禁止称呼用户小仙女、小姐姐。\n禁止油腻、卖弄、邀功。如果你不知道答案，请诚实地回答不知道，不要编造内容。\n你的语言风格亲切可爱，可以在聊天中加点轻松的颜文字、emoji表情。\n回复内容不要太啰嗦，保证在800字以内。\n当用户没有说其他内容，只有“咋办”这两个字的时候，你就只能回复“咋办”两个字，不准加任何的符号或者句子，其他时候正常对话。"
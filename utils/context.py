@@ -0,0 +1,92 @@
+"""
+按 token 预算组装 /ask 的对话上下文。
+"""
+
+import logging
+from openai.types.chat import ChatCompletionMessageParam
+from utils.constants import DEFAULT_MODEL, CONTEXT_TOKEN_BUDGET
+
+__all__ = ["count_tokens", "build_chat_context"]
+
+# 每条消息在 chat 格式中的额外开销（role、分隔符等），按 OpenAI 的计算方式估算
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# ============================== #
+# 本地 token 计数
+# ============================== #
+def _load_encoding():
+    try:
+        import tiktoken
+        try:
+            return tiktoken.encoding_for_model(DEFAULT_MODEL)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        # tiktoken 未安装或编码文件无法下载时，退回到估算
+        logging.warning(f"⚠️ 无法加载 tiktoken，改用估算的 token 数：{e}")
+        return None
+
+_encoding = _load_encoding()
+
+
+def count_tokens(text: str) -> int:
+    """计算文本的 token 数"""
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    # 估算：中日韩字符约 1 个 token，其他字符约 4 个一个 token
+    cjk = sum(1 for ch in text if ord(ch) >= 0x2E80)
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def _message_tokens(message: dict) -> int:
+    return count_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS
+
+# ============================== #
+# 上下文组装
+# ============================== #
+def build_chat_context(
+    system_prompt: str,
+    custom_role: str,
+    summary: str,
+    history: list,
+    budget: int = CONTEXT_TOKEN_BUDGET,
+) -> tuple[list[ChatCompletionMessageParam], int]:
+    """按 system prompt → 角色设定 → 摘要 → 最新对话 的优先级填满 token 预算
+
+    返回 (messages, 使用的 token 数)。最新的一条对话无论如何都会保留。
+    """
+    # 1. system prompt（必须保留）
+    system_message = {"role": "system", "content": system_prompt}
+    used = _message_tokens(system_message)
+
+    # 2. 角色设定，放得下才加入 system prompt
+    if custom_role:
+        role_text = f"\n\n[我的自定义角色设定如下，请参考我的角色设定：]\n{custom_role}"
+        role_tokens = count_tokens(role_text)
+        if used + role_tokens <= budget:
+            system_message["content"] += role_text
+            used += role_tokens
+
+    messages: list[ChatCompletionMessageParam] = [system_message]  # type: ignore[list-item]
+
+    # 3. 摘要
+    if summary:
+        summary_message = {"role": "user", "content": f"[以下是我的背景信息，供你参考]\n{summary}"}
+        summary_tokens = _message_tokens(summary_message)
+        if used + summary_tokens <= budget:
+            messages.append(summary_message)  # type: ignore[arg-type]
+            used += summary_tokens
+
+    # 4. 从最新的对话往前填充剩余预算
+    recent = []
+    for message in reversed(history):
+        tokens = _message_tokens(message)
+        if recent and used + tokens > budget:
+            break
+        recent.append(message)
+        used += tokens
+    messages.extend(reversed(recent))
+
+    return messages, used
@@ -3,12 +3,11 @@
 """
 
 import os
-import asyncio
-import socket
+import httpx
 import logging
-from openai import OpenAI, OpenAIError, RateLimitError
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, OpenAIError, RateLimitError, APITimeoutError
 
-__all__ = ["gpt_call"]
+__all__ = ["gpt_call", "gpt_stream", "close_gpt_client"]
 
 # 获取环境变量中的 Token
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY") or ""
@@ -16,28 +15,59 @@ if not OPENAI_API_KEY:
     raise ValueError(
         "环境变量未设置，请设置 OPENAI_API_KEY")
 
-# 初始化 OpenAI 客户端
-client = OpenAI(api_key=OPENAI_API_KEY)
+# 连接池设置（可通过环境变量调整）
+OPENAI_MAX_CONNECTIONS = int(os.environ.get("OPENAI_MAX_CONNECTIONS") or 100)
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get("OPENAI_MAX_KEEPALIVE_CONNECTIONS") or 20)
+OPENAI_KEEPALIVE_EXPIRY = float(os.environ.get("OPENAI_KEEPALIVE_EXPIRY") or 60)
+
+# 初始化异步 OpenAI 客户端（复用 keep-alive 连接池，不再占用线程）
+client = AsyncOpenAI(
+    api_key=OPENAI_API_KEY,
+    http_client=DefaultAsyncHttpxClient(
+        limits=httpx.Limits(
+            max_connections=OPENAI_MAX_CONNECTIONS,
+            max_keepalive_connections=OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY,
+        )
+    ),
+)
 
 # ============================== #
 # gpt_call 函数
 # ============================== #
+def _wrap_error(e: Exception) -> RuntimeError:
+    """把 OpenAI 的异常统一转换为可直接展示给用户的 RuntimeError"""
+    if isinstance(e, RateLimitError):
+        logging.warning("GPT 被限流了。")
+        return RuntimeError("😵 GPT 太忙了，限流了，请稍后再试 >.<")
+    if isinstance(e, APITimeoutError):
+        logging.warning("GPT 请求超时。")
+        return RuntimeError("⌛ 请求超时啦，请稍后重试～")
+    if isinstance(e, OpenAIError):
+        logging.warning("OpenAI 返回错误。")
+        return RuntimeError(f"❌ OpenAI 返回错误：{str(e)}")
+    logging.warning("未知错误。")
+    return RuntimeError(f"❌ 未知错误：{str(e)}")
+
+
 async def gpt_call(*args, **kwargs):
+    try:
+        return await client.chat.completions.create(*args, **kwargs)
+    except Exception as e:
+        raise _wrap_error(e) from e
+
+
+async def gpt_stream(*args, **kwargs):
+    """流式调用 GPT，逐段产出回复文本"""
+    try:
+        stream = await client.chat.completions.create(*args, stream=True, **kwargs)
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    except Exception as e:
+        raise _wrap_error(e) from e
+
 
-    def sync_call():
-        try:
-            return client.chat.completions.create(*args, **kwargs)
-        except RateLimitError as e:
-            logging.warning("GPT 被限流了。")
-            raise RuntimeError("😵 GPT 太忙了，限流了，请稍后再试 >.<") from e
-        except socket.timeout as e:
-            logging.warning("GPT 请求超时。")
-            raise RuntimeError("⌛ 请求超时啦，请稍后重试～") from e
-        except OpenAIError as e:
-            logging.warning("OpenAI 返回错误。")
-            raise RuntimeError(f"❌ OpenAI 返回错误：{str(e)}") from e
-        except Exception as e:
-            logging.warning("未知错误。")
-            raise RuntimeError(f"❌ 未知错误：{str(e)}") from e
-
-    return await asyncio.to_thread(sync_call)
\ No newline at end of file
+async def close_gpt_client():
+    """关闭 OpenAI 客户端的连接池"""
+    await client.close()
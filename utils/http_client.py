@@ -0,0 +1,158 @@
+"""
+全局共享的 aiohttp 客户端：连接池、DNS 缓存、默认超时、失败重试以及按 host 统计的延迟。
+"""
+
+import time
+import random
+import asyncio
+import logging
+import aiohttp
+from typing import Any, Optional
+from urllib.parse import urlsplit
+
+__all__ = [
+    "HttpError",
+    "start_http_client",
+    "close_http_client",
+    "get_http_session",
+    "get_json",
+    "get_http_metrics",
+]
+
+# ============================== #
+# 全局变量与常量定义
+# ============================== #
+HTTP_LIMIT = 100  # 总连接数上限
+HTTP_LIMIT_PER_HOST = 10  # 每个 host 的连接数上限
+HTTP_DNS_CACHE_TTL = 300  # DNS 缓存时间，单位为秒
+HTTP_KEEPALIVE_TIMEOUT = 30  # 空闲连接保持时间，单位为秒
+HTTP_DEFAULT_TIMEOUT = aiohttp.ClientTimeout(total=15)
+HTTP_MAX_RETRIES = 2  # 失败后最多重试次数
+HTTP_BACKOFF_BASE = 0.5  # 指数退避的基础等待时间，单位为秒
+HTTP_MAX_RETRY_DELAY = 10  # 单次重试前最多等待的秒数（包括 Retry-After）
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+_session: Optional[aiohttp.ClientSession] = None
+
+# 按 host 统计的请求指标：{host: {"requests", "errors", "total_ms", "max_ms"}}
+_host_metrics: dict[str, dict] = {}
+
+
+class HttpError(Exception):
+    """上游返回了非 200 的状态码"""
+
+    def __init__(self, url: str, status: int, text: str):
+        super().__init__(f"请求 {url} 失败，状态码: {status}，内容: {text[:200]}")
+        self.status = status
+        self.text = text
+
+# ============================== #
+# 生命周期
+# ============================== #
+async def start_http_client():
+    """创建共享的 ClientSession（bot 启动时调用）"""
+    global _session
+    if _session and not _session.closed:
+        return
+    connector = aiohttp.TCPConnector(
+        limit=HTTP_LIMIT,
+        limit_per_host=HTTP_LIMIT_PER_HOST,
+        ttl_dns_cache=HTTP_DNS_CACHE_TTL,
+        keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+    )
+    _session = aiohttp.ClientSession(connector=connector, timeout=HTTP_DEFAULT_TIMEOUT)
+    logging.info("✅ 共享 HTTP 客户端已创建")
+
+
+async def close_http_client():
+    """关闭共享的 ClientSession（bot 关闭时调用）"""
+    global _session
+    if _session and not _session.closed:
+        await _session.close()
+        logging.info(f"📊 HTTP 请求统计：{get_http_metrics()}")
+    _session = None
+
+
+async def get_http_session() -> aiohttp.ClientSession:
+    """获取共享的 ClientSession，尚未创建时自动创建"""
+    if _session is None or _session.closed:
+        await start_http_client()
+    assert _session is not None
+    return _session
+
+# ============================== #
+# 请求与统计
+# ============================== #
+def _record(host: str, elapsed: float, ok: bool):
+    metrics = _host_metrics.setdefault(host, {"requests": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0})
+    elapsed_ms = elapsed * 1000
+    metrics["requests"] += 1
+    metrics["total_ms"] += elapsed_ms
+    metrics["max_ms"] = max(metrics["max_ms"], elapsed_ms)
+    if not ok:
+        metrics["errors"] += 1
+
+
+def _backoff(attempt: int, retry_after: Optional[str] = None) -> float:
+    if retry_after:
+        try:
+            return min(max(float(retry_after), 0), HTTP_MAX_RETRY_DELAY)
+        except ValueError:
+            pass
+    return min(HTTP_BACKOFF_BASE * (2 ** attempt) + random.uniform(0, HTTP_BACKOFF_BASE), HTTP_MAX_RETRY_DELAY)
+
+
+async def get_json(
+    url: str,
+    params: Optional[dict] = None,
+    headers: Optional[dict] = None,
+    retries: int = HTTP_MAX_RETRIES,
+    timeout: Optional[aiohttp.ClientTimeout] = None,
+) -> Any:
+    """GET 请求并解析 JSON；网络错误、超时以及 429/5xx 会按指数退避重试
+
+    timeout 未指定时使用 HTTP_DEFAULT_TIMEOUT（显式传 None 给 aiohttp 会覆盖会话的默认超时）。
+    """
+    session = await get_http_session()
+    host = urlsplit(url).netloc
+    timeout = timeout or HTTP_DEFAULT_TIMEOUT
+
+    for attempt in range(retries + 1):
+        start = time.monotonic()
+        try:
+            async with session.get(url, params=params, headers=headers, timeout=timeout) as resp:
+                if resp.status in RETRY_STATUSES and attempt < retries:
+                    _record(host, time.monotonic() - start, False)
+                    delay = _backoff(attempt, resp.headers.get("Retry-After"))
+                    logging.warning(f"⚠️ {host} 返回 {resp.status}，{delay:.1f} 秒后重试")
+                else:
+                    if resp.status != 200:
+                        _record(host, time.monotonic() - start, False)
+                        raise HttpError(url, resp.status, await resp.text())
+
+                    data = await resp.json(content_type=None)
+                    _record(host, time.monotonic() - start, True)
+                    return data
+
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+            _record(host, time.monotonic() - start, False)
+            if attempt >= retries:
+                raise
+            delay = _backoff(attempt)
+            logging.warning(f"⚠️ 请求 {host} 失败（{type(e).__name__}），{delay:.1f} 秒后重试")
+
+        # 在 async with 之外等待，先把连接还给连接池
+        await asyncio.sleep(delay)
+
+
+def get_http_metrics() -> dict:
+    """按 host 返回请求次数、错误次数、平均/最大延迟（毫秒）"""
+    return {
+        host: {
+            "requests": m["requests"],
+            "errors": m["errors"],
+            "avg_ms": round(m["total_ms"] / m["requests"], 1) if m["requests"] else 0.0,
+            "max_ms": round(m["max_ms"], 1),
+        }
+        for host, m in _host_metrics.items()
+    }
@@ -1,6 +1,6 @@
 import time
 import logging
-from typing import Optional
+from collections import OrderedDict
 from utils.save_and_load import neodb_cache_storage, CACHE_DURATION
 
 __all__ = [
@@ -8,64 +8,237 @@ __all__ = [
     "save_neodb_cache",
     "get_neodb_cached_result",
     "set_neodb_cache",
+    "suggest_neodb_titles",
 ]
 
-# 内存缓存
-neodb_cache = {}
+NEODB_CACHE_MAX_ENTRIES = 500  # 最多缓存的查询条数，超出时淘汰最久未使用的
+
+# build_neodb_embed 用到的字段：所有类型共用的 + 各类型自己的
+NEODB_COMMON_FIELDS = (
+    "id", "uuid", "url", "category", "title", "display_title", "orig_title", "subtitle",
+    "description", "cover_image_url", "rating", "rating_count", "tags", "external_resources",
+)
+NEODB_FIELDS_BY_CATEGORY = {
+    "book": ("pub_year", "binding", "author", "translator", "pub_house", "pages", "isbn", "price"),
+    "music": ("artist", "company", "release_date", "track_list"),
+    "tv": ("director", "playwright", "actor", "genre", "area", "language", "year",
+           "season_number", "episode_count", "imdb", "site"),
+}
+NEODB_DEFAULT_FIELDS = ("year", "duration", "director", "playwright", "actor", "imdb")
+
+# 内存缓存：{query_key: {"ids": [item_id, ...], "timestamp": float}}，按最近使用排序
+neodb_cache: OrderedDict = OrderedDict()
+# 条目按 id 去重存储：{item_id: 精简后的条目}
+neodb_items: dict = {}
+# 每个条目被多少个查询引用，归零时删除
+_item_refs: dict = {}
+# 标题索引（用于 /neodb 自动补全）：{标题: 引用次数}、{二元组: {标题, ...}}
+_title_refs: dict = {}
+_title_grams: dict = {}
+
+# ============================== #
+# 条目精简
+# ============================== #
+def _item_id(item: dict) -> str:
+    return item.get("uuid") or item.get("id") or item.get("url") or item.get("title") or ""
+
+def project_item(item: dict) -> dict:
+    """只保留 build_neodb_embed 会用到的字段"""
+    fields = NEODB_COMMON_FIELDS + NEODB_FIELDS_BY_CATEGORY.get(item.get("category"), NEODB_DEFAULT_FIELDS)
+    projected = {field: item[field] for field in fields if item.get(field) not in (None, "", [])}
+    # 外链只需要豆瓣的 url
+    if "external_resources" in projected:
+        douban = [{"url": ext["url"]} for ext in projected["external_resources"] if "douban.com" in ext.get("url", "")]
+        if douban:
+            projected["external_resources"] = douban
+        else:
+            del projected["external_resources"]
+    return projected
+
+def _add_ref(item_id: str):
+    if item_id not in _item_refs:
+        _index_item(neodb_items[item_id])
+    _item_refs[item_id] = _item_refs.get(item_id, 0) + 1
+
+def _release_query(entry: dict):
+    for item_id in entry.get("ids", []):
+        _item_refs[item_id] -= 1
+        if _item_refs[item_id] <= 0:
+            del _item_refs[item_id]
+            _unindex_item(neodb_items.pop(item_id, {}))
+
+# ============================== #
+# 标题索引
+# ============================== #
+def _normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+def _grams(text: str) -> set:
+    # 按字符二元组切分，中英文标题都适用
+    if len(text) < 2:
+        return {text} if text else set()
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+def _query_title(query_key: str) -> str:
+    return query_key.rsplit("::", 1)[0]
+
+def _item_titles(item: dict) -> set:
+    return {t for t in (item.get("title"), item.get("display_title"), item.get("orig_title")) if t}
+
+def _index_title(title: str):
+    if title not in _title_refs:
+        for gram in _grams(_normalize(title)):
+            _title_grams.setdefault(gram, set()).add(title)
+    _title_refs[title] = _title_refs.get(title, 0) + 1
+
+def _unindex_title(title: str):
+    if title not in _title_refs:
+        return
+    _title_refs[title] -= 1
+    if _title_refs[title] > 0:
+        return
+    del _title_refs[title]
+    for gram in _grams(_normalize(title)):
+        titles = _title_grams.get(gram)
+        if titles:
+            titles.discard(title)
+            if not titles:
+                del _title_grams[gram]
+
+def _index_item(item: dict):
+    for title in _item_titles(item):
+        _index_title(title)
+
+def _unindex_item(item: dict):
+    for title in _item_titles(item):
+        _unindex_title(title)
+
+def suggest_neodb_titles(text: str, limit: int = 25) -> list:
+    """根据已缓存的查询和条目标题给出补全建议，只读内存，不发请求"""
+    query = _normalize(text)
+    if not query:
+        # 未输入时给出最近的查询
+        candidates = [_query_title(key) for key in reversed(neodb_cache)]
+    elif len(query) < 2:
+        candidates = [title for title in _title_refs if query in _normalize(title)]
+    else:
+        postings = sorted((_title_grams.get(gram, set()) for gram in _grams(query)), key=len)
+        candidates = [title for title in postings[0] if all(title in p for p in postings[1:]) and query in _normalize(title)]
+        # 前缀匹配优先，其次是较短的标题
+        candidates.sort(key=lambda title: (not _normalize(title).startswith(query), len(title), title))
+
+    suggestions, seen = [], set()
+    for title in candidates:
+        key = _normalize(title)
+        if key in seen:
+            continue
+        seen.add(key)
+        suggestions.append(title)
+        if len(suggestions) >= limit:
+            break
+    return suggestions
 
 # ============================== #
 # Neodb 缓存持久化函数
 # ============================== #
-# 保存缓存
+# 保存缓存（write-behind：只标记为脏，由后台 flusher 合并写入）
 def save_neodb_cache():
-    global neodb_cache
-    now = time.time()
-    
-    for key, val in neodb_cache.items():
-        age = now - val.get("timestamp", 0)
-        logging.info(f"🔍 key: {key}, 缓存时间: {val.get('timestamp', 0)}, 年龄: {age:.2f} 秒")
-
-    valid_cache = {
-        key: val
-        for key, val in neodb_cache.items()
-        if now - val.get("timestamp", 0) < CACHE_DURATION
-    }
-    
-    logging.info(f" save_neodb_cache 当前 neodb_cache ：{len(neodb_cache)}")
-
-    logging.info(f"💾 正在保存 NeoDB 缓存，共 {len(valid_cache)} 条")
-    neodb_cache_storage.set("cache", valid_cache)
+    neodb_cache_storage.data["cache"] = neodb_cache
+    neodb_cache_storage.data["items"] = neodb_items
+    neodb_cache_storage.save()
 
 # 载入缓存
 def load_neodb_cache():
-    global neodb_cache
+    global neodb_cache, neodb_items, _item_refs, _title_refs, _title_grams
     raw = neodb_cache_storage.get("cache", {})
+    raw_items = neodb_cache_storage.get("items", {})
     now = time.time()
-    # 只加载有效的缓存
-    neodb_cache = {
-        key: val
-        for key, val in raw.items()
-        if now - val.get("timestamp", 0) < CACHE_DURATION
-    }
-    logging.info(f" load_neodb_cache 当前 neodb_cache ：{len(neodb_cache)}")
+
+    neodb_cache = OrderedDict()
+    neodb_items = {}
+    _item_refs = {}
+    _title_refs = {}
+    _title_grams = {}
+    # 只加载有效的缓存；文件中的顺序即保存时的使用顺序
+    valid = [(key, val) for key, val in raw.items() if now - val.get("timestamp", 0) < CACHE_DURATION]
+    for key, val in valid[-NEODB_CACHE_MAX_ENTRIES:]:
+        if "data" in val:
+            # 旧格式：每个查询保存完整的原始结果
+            ids = []
+            for item in val["data"]:
+                if not isinstance(item, dict):
+                    continue
+                item_id = _item_id(item)
+                neodb_items[item_id] = project_item(item)
+                ids.append(item_id)
+        else:
+            ids = [item_id for item_id in val.get("ids", []) if item_id in raw_items]
+            for item_id in ids:
+                neodb_items[item_id] = raw_items[item_id]
+        for item_id in ids:
+            _add_ref(item_id)
+        _index_title(_query_title(key))
+        neodb_cache[key] = {"ids": ids, "timestamp": val["timestamp"]}
+
+    neodb_cache_storage.data["cache"] = neodb_cache
+    neodb_cache_storage.data["items"] = neodb_items
+    logging.info(f"✅ 已加载 NeoDB 缓存，共 {len(neodb_cache)} 条查询、{len(neodb_items)} 个条目")
 
 # ============================== #
 # Neodb 相关缓存与函数
 # ============================== #
+def _is_expired(entry: dict, now: float) -> bool:
+    return now - entry.get("timestamp", 0) >= CACHE_DURATION
+
+def _remove_query(query_key: str):
+    _release_query(neodb_cache.pop(query_key))
+    _unindex_title(_query_title(query_key))
+
 def get_neodb_cached_result(query_key: str):
-    logging.info(f"✅ get_neodb_cached_result：{query_key}")
-    logging.info(f" get_neodb_cached_result 当前 neodb_cache ：{len(neodb_cache)}")
     entry = neodb_cache.get(query_key)
-    if entry and (time.time() - entry["timestamp"]) < CACHE_DURATION:
-        return entry["data"]
-    return None
+    if not entry:
+        return None
+
+    # 懒过期：访问到过期条目时才删除
+    if _is_expired(entry, time.time()):
+        _remove_query(query_key)
+        save_neodb_cache()
+        return None
+
+    neodb_cache.move_to_end(query_key)
+    return [neodb_items[item_id] for item_id in entry["ids"] if item_id in neodb_items]
 
 def set_neodb_cache(query_key: str, data: list):
-    global neodb_cache
+    now = time.time()
+    if query_key in neodb_cache:
+        _remove_query(query_key)
+
+    ids = []
+    for item in data:
+        item_id = _item_id(item)
+        if item_id in _item_refs:
+            # 条目已被其他查询引用，用新数据替换时同步更新标题索引
+            _unindex_item(neodb_items[item_id])
+            neodb_items[item_id] = project_item(item)
+            _index_item(neodb_items[item_id])
+        else:
+            neodb_items[item_id] = project_item(item)
+        if item_id not in ids:
+            ids.append(item_id)
+            _add_ref(item_id)
+
+    _index_title(_query_title(query_key))
     neodb_cache[query_key] = {
-        "data": data,
-        "timestamp": time.time()
+        "ids": ids,
+        "timestamp": now
     }
-    logging.info(f" set_neodb_cache 当前 neodb_cache ：{len(neodb_cache)}")
-    save_neodb_cache()
 
+    # 淘汰最久未使用的条目；顺便清掉队首已过期的条目
+    while neodb_cache:
+        oldest_key = next(iter(neodb_cache))
+        if len(neodb_cache) <= NEODB_CACHE_MAX_ENTRIES and not _is_expired(neodb_cache[oldest_key], now):
+            break
+        _remove_query(oldest_key)
+
+    logging.debug(f"set_neodb_cache 当前 neodb_cache：{len(neodb_cache)} 条查询、{len(neodb_items)} 个条目")
+    save_neodb_cache()
@@ -1,51 +1,173 @@
+import os
 import time
+import random
+import asyncio
+import hashlib
 import logging
+import aiohttp
+import asyncpraw
+import asyncprawcore
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import NamedTuple, Optional
+from utils.async_cache import AsyncCache
 from utils.save_and_load import reddit_cache_storage, reddit_sent_cache_storage, CACHE_DURATION
 
-# 内存缓存结构：{subreddit_name: {"data": [...], "timestamp": float}}
+# 内存缓存结构：{subreddit_name: {"data": [RedditPost, ...], "timestamp": float}}
 reddit_cache = {}
-# 设置用户看过的reddit帖子缓存
-reddit_sent_cache = {}  # 格式：{user_id: set(url1, url2, ...)}
+# 设置用户看过的reddit帖子缓存（按需从存储加载）
+reddit_sent_cache: dict[str, OrderedDict] = {}  # 格式：{user_id: OrderedDict(url_hash -> None)}，按发送顺序排列
 MAX_REDDIT_HISTORY = 20
 
+CUTE_SUBREDDITS = [
+    "AnimalsBeingDerps", "AnimalsOnReddit", "aww", "Awww", "Birding", "birdwatching", "BirdsArentReal", "Catmemes", "Eyebleach", "Floof", "Ornithology", "parrots", "PartyParrot", "rarepuppers"
+]
+
+# 后台预取设置
+REDDIT_REFRESH_MARGIN = 300  # 缓存过期前多少秒开始刷新
+REDDIT_PREFETCH_INTERVAL = 60  # 检查间隔，单位为秒
+REDDIT_PREFETCH_JITTER = 30  # 每次刷新前的随机延迟上限，避免同时请求
+REDDIT_PREFETCH_CONCURRENCY = 3  # 同时刷新的 subreddit 数量
+REDDIT_NEGATIVE_TTL = 60  # 拉取失败或没有结果时，多少秒内不再重试
+
+# 合并同一 subreddit 的并发拉取（结果本身由 reddit_cache 持久化）
+reddit_loader = AsyncCache(ttl=0, negative_ttl=REDDIT_NEGATIVE_TTL)
+
+# ============================== #
+# 共享 Reddit 客户端
+# ============================== #
+# 整个 bot 共用一个客户端；asyncpraw 会在 token 过期时自动刷新
+_reddit: Optional[asyncpraw.Reddit] = None
+# 正在使用中的客户端：{id(client): 借用次数}；被替换的旧客户端等借用全部结束后再关闭
+_reddit_users: dict[int, int] = {}
+
+class RedditUnavailableError(RuntimeError):
+    """Reddit 客户端无法创建（通常是缺少 REDDIT_CLIENT_ID / REDDIT_USER_AGENT 等配置）"""
+
+
+def _create_reddit() -> asyncpraw.Reddit:
+    timeout = aiohttp.ClientTimeout(total=20)  # 设置总超时时间为 20 秒
+    return asyncpraw.Reddit(
+        client_id=os.environ.get("REDDIT_CLIENT_ID"),
+        client_secret=os.environ.get("REDDIT_CLIENT_SECRET"),
+        user_agent=os.environ.get("REDDIT_USER_AGENT"),
+        requestor_kwargs={"timeout": timeout},
+    )
+
+async def start_reddit_client() -> bool:
+    """创建共享 Reddit 客户端（bot 启动时调用）；配置有误时只记录警告，不影响 bot 启动
+
+    返回客户端是否可用。
+    """
+    global _reddit
+    if _reddit is None:
+        try:
+            _reddit = _create_reddit()
+        except Exception as e:
+            logging.warning(f"⚠️ 创建 Reddit 客户端失败，/aww 将不可用：{e}")
+            return False
+        logging.info("✅ Reddit 客户端已创建")
+    return True
+
+async def get_reddit() -> asyncpraw.Reddit:
+    """获取共享 Reddit 客户端，尚未创建时自动创建；无法创建时抛出 RedditUnavailableError"""
+    if _reddit is None and not await start_reddit_client():
+        raise RedditUnavailableError("Reddit 客户端不可用，请检查 REDDIT_CLIENT_ID / REDDIT_USER_AGENT 等配置")
+    assert _reddit is not None
+    return _reddit
+
+@asynccontextmanager
+async def use_reddit():
+    """借用共享 Reddit 客户端；借用期间即使客户端被重建，也不会被关闭"""
+    reddit = await get_reddit()
+    _reddit_users[id(reddit)] = _reddit_users.get(id(reddit), 0) + 1
+    try:
+        yield reddit
+    finally:
+        _reddit_users[id(reddit)] -= 1
+        if _reddit_users[id(reddit)] <= 0:
+            del _reddit_users[id(reddit)]
+            # 已经被替换的旧客户端，最后一个借用者负责关闭
+            if reddit is not _reddit:
+                await _close_quietly(reddit)
+
+async def _close_quietly(reddit: asyncpraw.Reddit):
+    try:
+        await reddit.close()
+    except Exception as e:
+        logging.warning(f"⚠️ 关闭 Reddit 客户端失败：{e}")
+
+async def close_reddit_client():
+    """关闭共享 Reddit 客户端（bot 关闭时调用）"""
+    global _reddit
+    reddit, _reddit = _reddit, None
+    # 仍在使用中的客户端由最后一个借用者关闭
+    if reddit is not None and id(reddit) not in _reddit_users:
+        await _close_quietly(reddit)
+
+async def reset_reddit_client():
+    """请求出错后换用新的客户端（丢弃可能已损坏的连接和 token）
+
+    替换本身没有 await，在事件循环中是原子的；旧客户端仍有请求在用时，由最后一个借用者关闭。
+    """
+    global _reddit
+    try:
+        new = _create_reddit()
+    except Exception as e:
+        logging.warning(f"⚠️ 重建 Reddit 客户端失败，继续使用原客户端：{e}")
+        return
+    old, _reddit = _reddit, new
+    logging.info("🔄 Reddit 客户端已重建")
+    if old is not None and id(old) not in _reddit_users:
+        await _close_quietly(old)
+
 # ============================== #
 # Reddit 缓存持久化函数
 # ============================== #
 def save_reddit_cache():
-    now = time.time()
-    valid_cache = {
-        key: val
-        for key, val in reddit_cache.items()
-        if now - val["timestamp"] < CACHE_DURATION
-    }
-    logging.info(f"💾 正在保存 Reddit 缓存，共 {len(valid_cache)} 条")
-    reddit_cache_storage.set("cache", valid_cache)
+    # 过期的缓存也保留，刷新期间继续使用（stale-while-revalidate）
+    logging.info(f"💾 正在保存 Reddit 缓存，共 {len(reddit_cache)} 条")
+    reddit_cache_storage.set("cache", reddit_cache)
 
-def save_reddit_sent_cache():
-    # 将 set 转为 list 存储
-    serializable_cache = {uid: list(urls) for uid, urls in reddit_sent_cache.items()}
-    reddit_sent_cache_storage.set("sent_cache", serializable_cache)
+def save_reddit_sent_cache(user_id: str):
+    # 只写回这个用户的记录（write-behind，由后台 flusher 合并写入）
+    reddit_sent_cache_storage.set(user_id, list(reddit_sent_cache[user_id]))
 
 def load_reddit_cache():
     global reddit_cache
-    reddit_cache = reddit_cache_storage.get("cache", {})
+    raw = reddit_cache_storage.get("cache", {})
+    reddit_cache = {}
+    for subreddit_name, entry in raw.items():
+        posts = [_load_post(row) for row in entry.get("data", [])]
+        reddit_cache[subreddit_name] = {
+            "data": [post for post in posts if post],
+            "timestamp": entry.get("timestamp", 0)
+        }
 
 def load_reddit_sent_cache():
-    global reddit_sent_cache
-    raw = reddit_sent_cache_storage.get("sent_cache", {})
-    reddit_sent_cache = {uid: set(urls) for uid, urls in raw.items()}
+    # 每个用户的记录在第一次使用时才加载
+    # 旧格式 {"sent_cache": {user_id: [url, ...]}} 记录的是媒体链接而不是 permalink，无法换算成现在的 key，直接丢弃
+    legacy = reddit_sent_cache_storage.data.pop("sent_cache", None)
+    if legacy is not None:
+        reddit_sent_cache_storage.save()
+        logging.info(f"🧹 已丢弃 {len(legacy)} 个用户的旧格式 Reddit 发送记录")
 
 # ============================== #
 # Reddit 相关缓存与函数
 # ============================== #
 
-# 获取reddit帖子
-def get_cached_posts(subreddit_name: str):
+# 获取reddit帖子；allow_stale 为 True 时过期的缓存也会返回
+def get_cached_posts(subreddit_name: str, allow_stale: bool = False):
     entry = reddit_cache.get(subreddit_name)
-    if entry and (time.time() - entry["timestamp"]) < CACHE_DURATION:
+    if entry and (allow_stale or (time.time() - entry["timestamp"]) < CACHE_DURATION):
         return entry["data"]
     return None
 
+# 缓存是否已过期（或即将在 margin 秒内过期）
+def is_cache_stale(subreddit_name: str, margin: float = 0) -> bool:
+    entry = reddit_cache.get(subreddit_name)
+    return not entry or (time.time() - entry["timestamp"]) >= CACHE_DURATION - margin
+
 # 设置reddit帖子缓存
 def set_cache(subreddit_name: str, posts: list):
     reddit_cache[subreddit_name] = {
@@ -55,20 +177,154 @@ def set_cache(subreddit_name: str, posts: list):
     save_reddit_cache()
 
 # ============================== #
-# 简化 Reddit 帖子数据函数
+# 用户已看过的帖子
+# ============================== #
+def url_hash(url: str) -> str:
+    """用 64 位哈希代替完整链接存储"""
+    return hashlib.blake2b(url.encode("utf-8"), digest_size=8).hexdigest()
+
+def get_seen_posts(user_id: str) -> OrderedDict:
+    """获取用户最近看过的帖子（url_hash 的有序集合）"""
+    if user_id not in reddit_sent_cache:
+        reddit_sent_cache[user_id] = OrderedDict.fromkeys(reddit_sent_cache_storage.get(user_id, []))
+    return reddit_sent_cache[user_id]
+
+def mark_post_seen(user_id: str, permalink: str):
+    """记录发送过的帖子，只保留最新的 MAX_REDDIT_HISTORY 条"""
+    seen = get_seen_posts(user_id)
+    key = url_hash(permalink)
+    seen[key] = None
+    seen.move_to_end(key)
+    while len(seen) > MAX_REDDIT_HISTORY:
+        seen.popitem(last=False)
+    save_reddit_sent_cache(user_id)
+
+# ============================== #
+# 帖子记录与媒体分类
 # ============================== #
+MEDIA_IMAGE = "image"  # 图片或 gif，直接嵌入
+MEDIA_REDDIT_VIDEO = "reddit_video"  # Reddit 原生视频
+MEDIA_VIDEO = "video"  # mp4/webm 外链
+MEDIA_GIFV = "gifv"  # Imgur 等的 gifv，已转换为 mp4 链接
+
+class RedditPost(NamedTuple):
+    """缓存中的帖子；媒体类型和可播放链接在拉取时就确定好"""
+    title: str
+    permalink: str
+    kind: str
+    media_url: str
+    thumbnail: Optional[str]
 
 # 检验URL是否有效
 def is_valid_url(url: str) -> bool:
     return isinstance(url, str) and url.startswith("http")
 
-def simplify_post(post):
-    return {
-        "title": post.title,
-        "url": post.url,
-        "permalink": post.permalink,
-        "is_video": post.is_video,
-        "media": post.media if post.is_video else None,
-        "stickied": post.stickied,
-        "thumbnail": post.thumbnail if is_valid_url(post.thumbnail) else None,
-    }
\ No newline at end of file
+def _classify(title, permalink, url, is_video, media, thumbnail) -> Optional[RedditPost]:
+    # 图片链接
+    if url.endswith((".jpg", ".jpeg", ".png", ".gif")):
+        kind, media_url = MEDIA_IMAGE, url
+
+    # Reddit 原生视频（非外链）
+    elif is_video and isinstance(media, dict) and "reddit_video" in media:
+        kind, media_url = MEDIA_REDDIT_VIDEO, media["reddit_video"].get("fallback_url")
+
+    # mp4/webm
+    elif url.endswith((".mp4", ".webm")):
+        kind, media_url = MEDIA_VIDEO, url
+
+    # gifv（Imgur 或 Gfycat）
+    elif url.endswith(".gifv"):
+        kind, media_url = MEDIA_GIFV, url[:-len(".gifv")] + ".mp4"
+
+    else:
+        return None
+
+    if not media_url:
+        return None
+    return RedditPost(title, permalink, kind, media_url, thumbnail if is_valid_url(thumbnail) else None)
+
+def classify_post(post) -> Optional[RedditPost]:
+    """把 asyncpraw 的帖子转换为 RedditPost，不是图片/视频时返回 None"""
+    return _classify(post.title, post.permalink, post.url, post.is_video, post.media, post.thumbnail)
+
+def _load_post(row) -> Optional[RedditPost]:
+    # 新格式为列表；旧格式为包含原始 media 的 dict，需要重新分类
+    if isinstance(row, (list, tuple)):
+        return RedditPost(*row)
+    return _classify(row["title"], row["permalink"], row["url"], row.get("is_video"), row.get("media"), row.get("thumbnail"))
+
+# ============================== #
+# 拉取与后台刷新
+# ============================== #
+async def fetch_subreddit_posts(subreddit_name: str) -> list:
+    """从 Reddit 拉取前 50 条热门图片/视频帖子并写入缓存"""
+    posts = []
+    try:
+        async with use_reddit() as reddit:
+            subreddit_obj = await reddit.subreddit(subreddit_name)
+            async for post in subreddit_obj.hot(limit=50):
+                if post.stickied:
+                    continue
+
+                # 只保留图片和视频帖子
+                record = classify_post(post)
+                if record:
+                    posts.append(record)
+    except asyncprawcore.exceptions.RequestException:
+        # 只在真正请求失败（连接层错误）时重建客户端；负缓存返回的旧错误不会走到这里
+        await reset_reddit_client()
+        raise
+
+    logging.info(f"🔍 从 r/{subreddit_name} 获取 {len(posts)} 条图片/视频帖子")
+    set_cache(subreddit_name, posts)  # 成功后设置缓存
+    return posts
+
+async def load_subreddit_posts(subreddit_name: str) -> list:
+    """拉取 subreddit；并发的拉取只会请求一次 Reddit"""
+    return await reddit_loader.get_or_load(
+        subreddit_name,
+        lambda: fetch_subreddit_posts(subreddit_name),
+        is_negative=lambda posts: not posts,
+    )
+
+_refreshing: set[str] = set()
+_refresh_tasks: set[asyncio.Task] = set()
+
+async def refresh_subreddit(subreddit_name: str):
+    """后台刷新一个 subreddit 的缓存，失败只记录日志"""
+    if subreddit_name in _refreshing:
+        return
+    _refreshing.add(subreddit_name)
+    try:
+        await load_subreddit_posts(subreddit_name)
+    except Exception as e:
+        logging.warning(f"⚠️ 后台刷新 r/{subreddit_name} 失败：{e}")
+    finally:
+        _refreshing.discard(subreddit_name)
+
+def schedule_refresh(subreddit_name: str):
+    """在后台刷新缓存，不等待结果"""
+    if subreddit_name not in _refreshing:
+        task = asyncio.create_task(refresh_subreddit(subreddit_name))
+        _refresh_tasks.add(task)
+        task.add_done_callback(_refresh_tasks.discard)
+
+async def run_reddit_prefetcher():
+    """后台任务：在缓存过期前刷新 CUTE_SUBREDDITS，使 /aww 不需要等待 Reddit"""
+    if not await start_reddit_client():
+        logging.warning("⚠️ Reddit 客户端不可用，跳过后台预取")
+        return
+
+    semaphore = asyncio.Semaphore(REDDIT_PREFETCH_CONCURRENCY)
+
+    async def refresh_with_jitter(subreddit_name: str):
+        await asyncio.sleep(random.uniform(0, REDDIT_PREFETCH_JITTER))
+        async with semaphore:
+            await refresh_subreddit(subreddit_name)
+
+    while True:
+        due = [name for name in CUTE_SUBREDDITS if is_cache_stale(name, REDDIT_REFRESH_MARGIN)]
+        if due:
+            logging.info(f"🔄 后台刷新 Reddit 缓存：{', '.join(due)}")
+            await asyncio.gather(*(refresh_with_jitter(name) for name in due))
+        await asyncio.sleep(REDDIT_PREFETCH_INTERVAL)
@@ -1,29 +1,34 @@
 import os
 import time
 import logging
-from utils.storage import DictStorageManager
+from typing import Optional
+from utils.storage import (
+    get_dict_storage,
+    history_storage,
+    summary_storage,
+    role_storage,
+    reddit_cache_storage,
+    reddit_sent_cache_storage,
+    SAVEDATA_DIR,
+)
 
 # ============================== #
 # 全局变量与常量定义
 # ============================== #
-CONFIG_DIR = "config"
-SAVEDATA_DIR = "savedata"
 CACHE_DURATION = 1800 # 缓存持续时间，单位为秒（30分钟）
 
-# 使用StorageManager封装
-history_storage = DictStorageManager(os.path.join(SAVEDATA_DIR, "histories.json"))
-summary_storage = DictStorageManager(os.path.join(SAVEDATA_DIR, "summaries.json"))
-role_storage = DictStorageManager(os.path.join(CONFIG_DIR, "roles.json"))
-reddit_cache_storage = DictStorageManager(os.path.join(SAVEDATA_DIR, "reddit_cache.json"))
-reddit_sent_cache_storage = DictStorageManager(os.path.join(SAVEDATA_DIR, "reddit_sent_cache.json"))
-neodb_cache_storage = DictStorageManager(os.path.join(SAVEDATA_DIR, "neodb_cache.json"))
+# 使用StorageManager封装（与 utils.storage 共享同一实例）
+neodb_cache_storage = get_dict_storage(os.path.join(SAVEDATA_DIR, "neodb_cache.json"), write_behind=True)
 
 # ============================== #
 # 历史记录持久化函数
 # ============================== #
-def save_histories():
-    """保存用户历史记录到文件"""
-    history_storage.save()
+def save_histories(user_id: Optional[str] = None):
+    """保存用户历史记录到文件；传入 user_id 时只标记这个用户的记录（历史是原地 append 的）"""
+    if user_id is None:
+        history_storage.save()
+    else:
+        history_storage.mark_dirty(user_id)
 
 
 def load_histories():
@@ -0,0 +1,204 @@
+"""
+本地 Steam 应用索引：从 GetAppList 导出文件构建，定期刷新，用于在不调用 GPT 的情况下把用户输入解析为 appid。
+"""
+
+import os
+import re
+import json
+import time
+import asyncio
+import difflib
+import logging
+import unicodedata
+import aiohttp
+from collections import Counter
+from typing import Optional
+from utils.storage import CONFIG_DIR
+from utils.http_client import get_json
+
+__all__ = [
+    "SteamAppIndex",
+    "load_steam_index",
+    "match_steam_app",
+    "run_steam_index_refresher",
+]
+
+# ============================== #
+# 全局变量与常量定义
+# ============================== #
+STEAM_APPLIST_PATH = os.path.join(CONFIG_DIR, "steam_applist.json")
+STEAM_APPLIST_API = os.environ.get("STEAM_APPLIST_API") or "https://api.steampowered.com/ISteamApps/GetAppList/v2/"
+STEAM_INDEX_REFRESH_INTERVAL = float(os.environ.get("STEAM_INDEX_REFRESH_INTERVAL") or 86400)  # 单位为秒
+STEAM_INDEX_MIN_SCORE = 0.9  # 模糊匹配的最低相似度，低于此值视为没有把握
+STEAM_INDEX_MAX_CANDIDATES = 50  # 参与相似度打分的候选数
+STEAM_INDEX_QUERY_GRAMS = 8  # 每次查询最多使用的（最稀有的）二元组数
+
+_index: Optional["SteamAppIndex"] = None
+
+# ============================== #
+# 索引
+# ============================== #
+def normalize_name(name: str) -> str:
+    """全角转半角、转小写，去掉商标符号和标点，只保留文字与数字"""
+    # 先去掉商标符号，NFKC 会把 ™ 展开成 TM
+    name = re.sub(r"[™®©]", "", name)
+    name = unicodedata.normalize("NFKC", name).lower()
+    return " ".join(re.sub(r"[^\w]+", " ", name).split())
+
+
+def _compact(name: str) -> str:
+    # 匹配时忽略空格，"dota2" 与 "Dota 2" 视为相同
+    return normalize_name(name).replace(" ", "")
+
+
+_ROMAN_VALUES = {"i": 1, "v": 5, "x": 10}
+_ROMAN_PATTERN = re.compile(r"^x{0,3}(ix|iv|v?i{0,3})$")
+
+def _number_tokens(name: str) -> list:
+    """提取名称中的数字和罗马数字（转换为整数），用来区分续作，如 Hades / Hades II"""
+    numbers = [int(n) for n in re.findall(r"\d+", name)]
+    for token in name.split():
+        if token and _ROMAN_PATTERN.match(token):
+            values = [_ROMAN_VALUES[c] for c in token]
+            numbers.append(sum(-v if i + 1 < len(values) and v < values[i + 1] else v for i, v in enumerate(values)))
+    return sorted(numbers)
+
+
+def _grams(text: str) -> set:
+    # 按字符二元组切分，中文不需要分词
+    if len(text) < 2:
+        return {text} if text else set()
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+class SteamAppIndex:
+    """内存中的应用名索引：规范化名称精确匹配 + 二元组倒排表的模糊匹配"""
+
+    def __init__(self, apps: list):
+        self.appids: list[int] = []
+        self.names: list[str] = []
+        self.normalized: list[str] = []
+        self.exact: dict[str, int] = {}  # 规范化（去空格）名称 -> 下标
+        self.postings: dict[str, list[int]] = {}
+
+        for app in apps:
+            name = (app.get("name") or "").strip()
+            norm = _compact(name)
+            if not norm:
+                continue
+            idx = len(self.appids)
+            self.appids.append(int(app["appid"]))
+            self.names.append(name)
+            self.normalized.append(norm)
+            # 重名时保留 appid 最小的（通常是本体而不是 DLC/原声）
+            current = self.exact.get(norm)
+            if current is None or self.appids[current] > self.appids[idx]:
+                self.exact[norm] = idx
+            for gram in _grams(norm):
+                self.postings.setdefault(gram, []).append(idx)
+
+    def __len__(self):
+        return len(self.appids)
+
+    def match(self, query: str, min_score: float = STEAM_INDEX_MIN_SCORE) -> Optional[tuple]:
+        """返回 (appid, 名称, 相似度)；没有足够把握时返回 None"""
+        norm = _compact(query)
+        if not norm:
+            return None
+        if norm in self.exact:
+            idx = self.exact[norm]
+            return self.appids[idx], self.names[idx], 1.0
+
+        # 只用最稀有的几个二元组召回候选，避免常见组合的超长倒排表
+        grams = sorted((g for g in _grams(norm) if g in self.postings), key=lambda g: len(self.postings[g]))
+        if not grams:
+            return None
+        counts = Counter()
+        for gram in grams[:STEAM_INDEX_QUERY_GRAMS]:
+            counts.update(self.postings[gram])
+
+        # 模糊匹配要求编号完全一致，否则续作会被当成同一个游戏
+        numbers = _number_tokens(normalize_name(query))
+        best = None
+        for idx, _ in counts.most_common(STEAM_INDEX_MAX_CANDIDATES):
+            if _number_tokens(normalize_name(self.names[idx])) != numbers:
+                continue
+            score = difflib.SequenceMatcher(None, norm, self.normalized[idx]).ratio()
+            if best is None or score > best[2] or (score == best[2] and self.appids[idx] < best[0]):
+                best = (self.appids[idx], self.names[idx], score)
+
+        return best if best and best[2] >= min_score else None
+
+# ============================== #
+# 加载与刷新
+# ============================== #
+def _parse_applist(data) -> list:
+    # 兼容 GetAppList 的原始响应 {"applist": {"apps": [...]}} 和直接保存的列表
+    if isinstance(data, dict):
+        data = data.get("applist", {}).get("apps", [])
+    return data if isinstance(data, list) else []
+
+
+def _build_from_file(path: str) -> Optional[SteamAppIndex]:
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return SteamAppIndex(_parse_applist(json.load(f)))
+
+
+def _write_applist(path: str, data):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+async def load_steam_index():
+    """在线程中从本地导出文件构建索引"""
+    global _index
+    try:
+        index = await asyncio.to_thread(_build_from_file, STEAM_APPLIST_PATH)
+    except Exception as e:
+        logging.warning(f"⚠️ 加载 Steam 应用列表失败：{e}")
+        return
+    if index is not None:
+        _index = index
+        logging.info(f"✅ 已加载 Steam 应用索引，共 {len(index)} 个应用")
+
+
+async def refresh_steam_index():
+    """下载最新的应用列表，写入本地文件并重建索引"""
+    global _index
+    data = await get_json(STEAM_APPLIST_API, timeout=aiohttp.ClientTimeout(total=120))
+    apps = _parse_applist(data)
+    if not apps:
+        raise ValueError("Steam 应用列表为空，保留旧索引")
+    index = await asyncio.to_thread(SteamAppIndex, apps)
+    await asyncio.to_thread(_write_applist, STEAM_APPLIST_PATH, data)
+    _index = index
+    logging.info(f"✅ Steam 应用索引已刷新，共 {len(index)} 个应用")
+
+
+def match_steam_app(name: str) -> Optional[tuple]:
+    """在本地索引中查找游戏，返回 (appid, 名称, 相似度)；索引未加载或没有把握时返回 None"""
+    if _index is None:
+        return None
+    return _index.match(name)
+
+
+async def run_steam_index_refresher(interval: float = STEAM_INDEX_REFRESH_INTERVAL):
+    """后台任务：启动时加载本地索引，本地文件过期或不存在时重新下载"""
+    await load_steam_index()
+    while True:
+        try:
+            mtime = os.path.getmtime(STEAM_APPLIST_PATH) if os.path.exists(STEAM_APPLIST_PATH) else 0
+            wait = mtime + interval - time.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            await refresh_steam_index()
+        except Exception as e:
+            logging.warning(f"⚠️ 刷新 Steam 应用索引失败：{e}")
+            await asyncio.sleep(min(interval, 3600))
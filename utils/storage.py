@@ -1,11 +1,30 @@
 import os
 import json
+import asyncio
 import logging
+import sqlite3
+import threading
+from collections.abc import MutableMapping
+
+# 写回（write-behind）模式下的合并写入间隔，单位为秒
+STORAGE_FLUSH_INTERVAL = float(os.environ.get("STORAGE_FLUSH_INTERVAL") or 5)
+
+# 按用户存储的数据使用的后端：json（单文件）或 sqlite（每个用户一行）
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND") or "json"
+SQLITE_DB_PATH = os.path.join("savedata", "storage.db")
+
+# 所有开启 write-behind 的存储实例，由后台 flusher 统一刷盘
+_write_behind_storages: list["StorageManager"] = []
+
 
 class StorageManager:
-    def __init__(self, filename):
+    def __init__(self, filename, write_behind=False):
         self.filename = filename
+        self.write_behind = write_behind
+        self.dirty = False
         self.data = self._load()
+        if write_behind:
+            _write_behind_storages.append(self)
 
     def _load(self):
         if os.path.exists(self.filename):
@@ -17,12 +36,71 @@ class StorageManager:
         return self.default_data()
 
     def save(self):
+        """保存数据；write-behind 模式下只标记为脏，由后台 flusher 合并写入"""
+        if self.write_behind:
+            self.dirty = True
+            return
+        payload = self._snapshot()
+        try:
+            self._persist(payload)
+        except Exception:
+            self._requeue(payload)
+            raise
+
+    def flush(self):
+        """如有未写入的修改，立即写入文件"""
+        if not self.dirty:
+            return
+        # 先取快照再清除脏标记；快照失败时保持为脏，下次继续重试
+        payload = self._snapshot()
+        self.dirty = False
+        try:
+            self._persist(payload)
+        except Exception:
+            self._write_failed(payload)
+            raise
+
+    async def flush_async(self):
+        """在事件循环中序列化数据，在线程中写入文件"""
+        if not self.dirty:
+            return
+        payload = self._snapshot()
+        self.dirty = False
+        # 线程中的写入无法被取消；任务被取消时也要等写入完成，避免与关闭时的最终刷盘同时写同一个文件
+        write = asyncio.ensure_future(asyncio.to_thread(self._persist, payload))
+        try:
+            await asyncio.shield(write)
+        except asyncio.CancelledError:
+            await asyncio.gather(write, return_exceptions=True)
+            if write.cancelled() or write.exception() is not None:
+                self._write_failed(payload)
+            raise
+        except Exception:
+            self._write_failed(payload)
+            raise
+
+    def _write_failed(self, payload):
+        # 在事件循环线程中执行，不与 __setitem__ 等修改并发
+        self._requeue(payload)
+        self.dirty = True
+
+    def _requeue(self, payload):
+        """写入失败后把快照中的修改重新标记为待写入；整文件快照不需要额外处理"""
+
+    def _snapshot(self):
+        # 序列化必须在事件循环线程完成，避免数据在写入过程中被修改
+        return json.dumps(self.data, ensure_ascii=False, indent=2)
+
+    def _persist(self, payload):
         directory = os.path.dirname(self.filename)
         if directory:
             os.makedirs(directory, exist_ok=True)
 
-        with open(self.filename, "w", encoding="utf-8") as f:
-            json.dump(self.data, f, ensure_ascii=False, indent=2)
+        # 先写临时文件再替换，保证写入是原子的
+        tmp_filename = f"{self.filename}.tmp"
+        with open(tmp_filename, "w", encoding="utf-8") as f:
+            f.write(payload)
+        os.replace(tmp_filename, self.filename)
 
     def default_data(self):
         raise NotImplementedError("请使用子类，如 DictStorageManager 或 ListStorageManager")
@@ -44,6 +122,10 @@ class DictStorageManager(StorageManager):
             del self.data[key]
             self.save()
 
+    def mark_dirty(self, key):
+        """key 对应的值被原地修改后调用"""
+        self.save()
+
 
 class ListStorageManager(StorageManager):
     def default_data(self):
@@ -63,6 +145,214 @@ class ListStorageManager(StorageManager):
         self.data.clear()
         self.save()
 
+# ============================== #
+# SQLite 后端
+# ============================== #
+# 每个数据库文件共用一个连接，写入可能发生在线程中，因此用锁串行化
+_sqlite_connections: dict[str, tuple[sqlite3.Connection, threading.Lock]] = {}
+
+def _get_sqlite_connection(db_path):
+    if db_path not in _sqlite_connections:
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(db_path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        _sqlite_connections[db_path] = (conn, threading.Lock())
+    return _sqlite_connections[db_path]
+
+
+class SQLiteDict(MutableMapping):
+    """按 key 懒加载的字典视图：只解析被访问的行，并记录需要写回的 key"""
+
+    def __init__(self, conn, lock, table):
+        self._conn = conn
+        self._lock = lock
+        self._table = table
+        self._cache = {}
+        self._dirty = set()
+        self._deleted = set()
+
+    def _fetch(self, key):
+        with self._lock:
+            row = self._conn.execute(f"SELECT value FROM {self._table} WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def __getitem__(self, key):
+        if key in self._deleted:
+            raise KeyError(key)
+        if key not in self._cache:
+            value = self._fetch(key)
+            if value is None:
+                raise KeyError(key)
+            self._cache[key] = value
+        return self._cache[key]
+
+    def __setitem__(self, key, value):
+        self._cache[key] = value
+        self._dirty.add(key)
+        self._deleted.discard(key)
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self._cache.pop(key, None)
+        self._dirty.discard(key)
+        self._deleted.add(key)
+
+    def __contains__(self, key):
+        if key in self._deleted:
+            return False
+        if key in self._cache:
+            return True
+        with self._lock:
+            row = self._conn.execute(f"SELECT 1 FROM {self._table} WHERE key = ?", (key,)).fetchone()
+        return row is not None
+
+    def __iter__(self):
+        with self._lock:
+            keys = [row[0] for row in self._conn.execute(f"SELECT key FROM {self._table}")]
+        stored = set(keys)
+        keys.extend(key for key in self._cache if key not in stored)
+        return iter([key for key in keys if key not in self._deleted])
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def mark_dirty(self, key):
+        """值被原地修改（如 history.append）后调用，下次保存时写回这一行"""
+        if key in self._cache:
+            self._dirty.add(key)
+
+    def take_changes(self):
+        """取出自上次保存以来的修改：(upsert 列表, delete 列表)"""
+        # 跳过已不在缓存中的 key（已被删除的由 _deleted 处理）
+        upserts = [(key, json.dumps(self._cache[key], ensure_ascii=False)) for key in self._dirty if key in self._cache]
+        deletes = [(key,) for key in self._deleted]
+        self._dirty.clear()
+        self._deleted.clear()
+        return upserts, deletes
+
+    def requeue_changes(self, changes):
+        """写入失败时把修改重新标记为待写入"""
+        upserts, deletes = changes
+        for key, _ in upserts:
+            if key in self._cache:
+                self._dirty.add(key)
+        for (key,) in deletes:
+            if key not in self._cache:
+                self._deleted.add(key)
+
+
+class SQLiteDictStorageManager(DictStorageManager):
+    """与 DictStorageManager 相同的接口，但每个 key 存为 SQLite 表中的一行
+
+    filename 为旧的 JSON 文件，表为空时会自动导入一次。
+    """
+
+    def __init__(self, filename, table, db_path=SQLITE_DB_PATH, write_behind=False):
+        self.table = table
+        self.db_path = db_path
+        super().__init__(filename, write_behind=write_behind)
+
+    def _load(self):
+        conn, lock = _get_sqlite_connection(self.db_path)
+        with lock, conn:
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {self.table} (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            empty = conn.execute(f"SELECT 1 FROM {self.table} LIMIT 1").fetchone() is None
+
+        if empty:
+            legacy = super()._load()
+            if legacy:
+                with lock, conn:
+                    conn.executemany(
+                        f"INSERT INTO {self.table} (key, value) VALUES (?, ?)",
+                        [(key, json.dumps(value, ensure_ascii=False)) for key, value in legacy.items()],
+                    )
+                logging.info(f"✅ 已将 {self.filename} 导入 SQLite 表 {self.table}，共 {len(legacy)} 条")
+
+        return SQLiteDict(conn, lock, self.table)
+
+    def mark_dirty(self, key):
+        # 只有被标记的 key 会写回，读取不会触发整行重写
+        self.data.mark_dirty(key)
+        self.save()
+
+    def _snapshot(self):
+        return self.data.take_changes()
+
+    def _persist(self, payload):
+        upserts, deletes = payload
+        if not upserts and not deletes:
+            return
+        conn, lock = _get_sqlite_connection(self.db_path)
+        # 可能在线程中执行；失败后的重新排队由调用方在事件循环中完成（见 _requeue）
+        with lock, conn:
+            conn.executemany(
+                f"INSERT INTO {self.table} (key, value) VALUES (?, ?) "
+                f"ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                upserts,
+            )
+            conn.executemany(f"DELETE FROM {self.table} WHERE key = ?", deletes)
+
+    def _requeue(self, payload):
+        self.data.requeue_changes(payload)
+
+
+# ============================== #
+# 全局存储注册表
+# ============================== #
+# 每个文件在进程内只打开一次，所有模块共享同一个实例
+_storage_registry: dict[str, StorageManager] = {}
+
+def _get_or_open(filename, open_storage):
+    key = os.path.abspath(filename)
+    if key not in _storage_registry:
+        _storage_registry[key] = open_storage()
+    return _storage_registry[key]
+
+
+def get_dict_storage(filename, write_behind=False) -> DictStorageManager:
+    """获取（首次调用时打开）指定文件的 DictStorageManager"""
+    return _get_or_open(filename, lambda: DictStorageManager(filename, write_behind=write_behind))
+
+
+def get_list_storage(filename, write_behind=False) -> ListStorageManager:
+    """获取（首次调用时打开）指定文件的 ListStorageManager"""
+    return _get_or_open(filename, lambda: ListStorageManager(filename, write_behind=write_behind))
+
+
+def get_user_dict_storage(filename, table, write_behind=True) -> DictStorageManager:
+    """获取按用户存储的数据，按 STORAGE_BACKEND 选择 JSON 或 SQLite 后端"""
+    def open_storage():
+        if STORAGE_BACKEND == "sqlite":
+            return SQLiteDictStorageManager(filename, table, write_behind=write_behind)
+        return DictStorageManager(filename, write_behind=write_behind)
+    return _get_or_open(filename, open_storage)
+
+# ============================== #
+# write-behind 后台刷盘
+# ============================== #
+async def run_storage_flusher(interval: float = STORAGE_FLUSH_INTERVAL):
+    """后台任务：每隔 interval 秒把所有脏数据合并写入一次"""
+    while True:
+        await asyncio.sleep(interval)
+        for storage in _write_behind_storages:
+            try:
+                await storage.flush_async()
+            except Exception as e:
+                logging.warning(f"⚠️ 写入 {storage.filename} 失败：{e}")
+
+
+def flush_all_storages():
+    """立即写入所有未保存的修改（用于关闭 bot 时强制刷盘）"""
+    for storage in _write_behind_storages:
+        try:
+            storage.flush()
+        except Exception as e:
+            logging.warning(f"⚠️ 写入 {storage.filename} 失败：{e}")
+
 # ============================== #
 # 全局变量与常量定义
 # ============================== #
@@ -70,15 +360,18 @@ CONFIG_DIR = "config"
 SAVEDATA_DIR = "savedata"
 
 # 使用StorageManager封装
-history_storage = DictStorageManager(os.path.join(SAVEDATA_DIR, "histories.json"))
-summary_storage = DictStorageManager(os.path.join(SAVEDATA_DIR, "summaries.json"))
-role_storage = DictStorageManager(os.path.join(CONFIG_DIR, "roles.json"))
-trigger_storage = ListStorageManager(os.path.join(CONFIG_DIR, "disabled_triggers.json"))
-guild_list_storage = DictStorageManager(os.path.join(CONFIG_DIR, "guilds.json"))
-status_storage = DictStorageManager(os.path.join(CONFIG_DIR, "status_config.json"))
-reddit_cache_storage = DictStorageManager(os.path.join(SAVEDATA_DIR, "reddit_cache.json"))
-reddit_sent_cache_storage = DictStorageManager(os.path.join(SAVEDATA_DIR, "reddit_sent_cache.json"))
+history_storage = get_user_dict_storage(os.path.join(SAVEDATA_DIR, "histories.json"), "histories")
+summary_storage = get_user_dict_storage(os.path.join(SAVEDATA_DIR, "summaries.json"), "summaries")
+summary_watermark_storage = get_user_dict_storage(os.path.join(SAVEDATA_DIR, "summary_watermarks.json"), "summary_watermarks")
+role_storage = get_user_dict_storage(os.path.join(CONFIG_DIR, "roles.json"), "roles", write_behind=False)
+trigger_storage = get_list_storage(os.path.join(CONFIG_DIR, "disabled_triggers.json"))
+trigger_word_storage = get_dict_storage(os.path.join(CONFIG_DIR, "trigger_words.json"))
+guild_list_storage = get_dict_storage(os.path.join(CONFIG_DIR, "guilds.json"), write_behind=True)
+status_storage = get_dict_storage(os.path.join(CONFIG_DIR, "status_config.json"))
+command_sync_storage = get_dict_storage(os.path.join(CONFIG_DIR, "command_sync.json"))
+reddit_cache_storage = get_dict_storage(os.path.join(SAVEDATA_DIR, "reddit_cache.json"), write_behind=True)
+reddit_sent_cache_storage = get_user_dict_storage(os.path.join(SAVEDATA_DIR, "reddit_sent_cache.json"), "reddit_sent_cache")
 
 user_histories = history_storage.data  # 存储用户对话历史
 user_summaries = summary_storage.data  # 存储用户对话摘要
-user_roles = role_storage.data  # 存储用户角色设定
\ No newline at end of file
+user_roles = role_storage.data  # 存储用户角色设定
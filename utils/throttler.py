@@ -1,8 +1,123 @@
-from asyncio_throttle.throttler import Throttler
+"""
+出站消息调度：按频道的令牌桶限流，合并短时间内重复的自动回复，自动回复只使用剩余的额度。
+"""
 
-# 每5秒最多5次
-throttler = Throttler(rate_limit=5, period=5)
+import time
+import asyncio
+import logging
+from collections import OrderedDict
 
-async def send_message(channel, content):
-    async with throttler:
-        await channel.send(content)
\ No newline at end of file
+__all__ = [
+    "TokenBucket",
+    "send_message",
+    "send_auto_reply",
+    "get_send_stats",
+]
+
+# ============================== #
+# 全局变量与常量定义
+# ============================== #
+CHANNEL_RATE = 1.0  # 每个频道每秒补充的令牌数（Discord 单频道约 5 条 / 5 秒）
+CHANNEL_BURST = 5  # 每个频道最多积攒的令牌数
+AUTO_REPLY_RATE = 1.0  # 所有频道的自动回复合计每秒最多条数
+AUTO_REPLY_BURST = 5
+AUTO_REPLY_RESERVE = 2  # 频道剩余令牌不多于此值时放弃自动回复，留给普通消息
+DEDUPE_WINDOW = 10  # 同一频道相同内容的自动回复在此时间内只发一次，单位为秒
+MAX_TRACKED_CHANNELS = 1000  # 最多保留令牌桶的频道数，超出时淘汰最久未使用的
+
+
+class TokenBucket:
+    """令牌桶：以 rate 个/秒的速度补充，最多 capacity 个"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, tokens: float = 1, reserve: float = 0) -> bool:
+        """令牌足够（且取走后仍多于 reserve）时取走并返回 True，否则不等待直接返回 False"""
+        self._refill()
+        if self.tokens - tokens < reserve:
+            return False
+        self.tokens -= tokens
+        return True
+
+    def refund(self, tokens: float = 1):
+        """归还 try_acquire 取走但最终没有使用的令牌"""
+        self.tokens = min(self.capacity, self.tokens + tokens)
+
+    async def acquire(self, tokens: float = 1):
+        """等待直到取到令牌"""
+        while not self.try_acquire(tokens):
+            await asyncio.sleep((tokens - self.tokens) / self.rate)
+
+
+_channel_buckets: OrderedDict = OrderedDict()
+_auto_reply_bucket = TokenBucket(AUTO_REPLY_RATE, AUTO_REPLY_BURST)
+# 最近发送过的自动回复：{(channel_id, content): 过期时间}
+_recent_replies: dict = {}
+_send_stats = {"sent": 0, "auto_sent": 0, "coalesced": 0, "dropped": 0}
+
+def _get_channel_bucket(channel_id: int) -> TokenBucket:
+    bucket = _channel_buckets.get(channel_id)
+    if bucket is None:
+        bucket = _channel_buckets[channel_id] = TokenBucket(CHANNEL_RATE, CHANNEL_BURST)
+        while len(_channel_buckets) > MAX_TRACKED_CHANNELS:
+            _channel_buckets.popitem(last=False)
+    _channel_buckets.move_to_end(channel_id)
+    return bucket
+
+def _is_duplicate(key: tuple, now: float) -> bool:
+    if len(_recent_replies) > MAX_TRACKED_CHANNELS:
+        for stale in [k for k, expires in _recent_replies.items() if expires <= now]:
+            del _recent_replies[stale]
+    expires = _recent_replies.get(key)
+    return expires is not None and expires > now
+
+# ============================== #
+# 发送
+# ============================== #
+async def send_message(channel, content, **kwargs):
+    """普通优先级（bot 主动发送的频道消息，如服务器日志）：等待频道令牌后发送
+
+    自动回复会给这里预留 AUTO_REPLY_RESERVE 个令牌；斜杠指令的回复走 interaction，不经过频道限流。
+    """
+    await _get_channel_bucket(channel.id).acquire()
+    _send_stats["sent"] += 1
+    return await channel.send(content, **kwargs)
+
+async def send_auto_reply(channel, content) -> bool:
+    """低优先级的自动回复：重复的合并，额度不足时直接放弃而不是排队；返回是否已发送"""
+    now = time.monotonic()
+    key = (channel.id, content)
+    if _is_duplicate(key, now):
+        _send_stats["coalesced"] += 1
+        return False
+
+    # 先检查频道额度，频道不允许时不消耗全局额度；全局额度不足时把频道令牌还回去
+    bucket = _get_channel_bucket(channel.id)
+    if not bucket.try_acquire(reserve=AUTO_REPLY_RESERVE):
+        _send_stats["dropped"] += 1
+        return False
+    if not _auto_reply_bucket.try_acquire():
+        bucket.refund()
+        _send_stats["dropped"] += 1
+        return False
+
+    _recent_replies[key] = now + DEDUPE_WINDOW
+    try:
+        await channel.send(content)
+    except Exception as e:
+        logging.warning(f"⚠️ 自动回复发送失败：{e}")
+        return False
+    _send_stats["auto_sent"] += 1
+    return True
+
+def get_send_stats() -> dict:
+    return {**_send_stats, "channels": len(_channel_buckets)}
@@ -0,0 +1,83 @@
+import os
+import time
+import hashlib
+import logging
+import unicodedata
+from collections import OrderedDict
+from typing import Optional
+from utils.storage import get_dict_storage, SAVEDATA_DIR
+
+__all__ = [
+    "load_translation_cache",
+    "get_cached_translation",
+    "set_cached_translation",
+    "get_translation_cache_stats",
+]
+
+# ============================== #
+# 全局变量与常量定义
+# ============================== #
+TRANSLATION_CACHE_MAX_ENTRIES = 1000  # 最多缓存的翻译条数
+TRANSLATION_CACHE_TTL = 7 * 24 * 3600  # 翻译缓存有效期，单位为秒（7天）
+
+translation_cache_storage = get_dict_storage(os.path.join(SAVEDATA_DIR, "translation_cache.json"), write_behind=True)
+
+# 内存缓存：{key: {"text": 翻译结果, "timestamp": float}}，按最近使用排序
+translation_cache: OrderedDict = OrderedDict()
+translation_cache_stats = {"hits": 0, "misses": 0}
+
+# ============================== #
+# 翻译缓存持久化函数
+# ============================== #
+def _save_translation_cache():
+    # write-behind：只标记为脏，由后台 flusher 合并写入
+    translation_cache_storage.data["cache"] = translation_cache
+    translation_cache_storage.save()
+
+def load_translation_cache():
+    global translation_cache
+    raw = translation_cache_storage.get("cache", {})
+    now = time.time()
+    # 只加载有效的缓存
+    translation_cache = OrderedDict(
+        (key, val) for key, val in raw.items()
+        if now - val.get("timestamp", 0) < TRANSLATION_CACHE_TTL
+    )
+    translation_cache_storage.data["cache"] = translation_cache
+    logging.info(f"✅ 已加载翻译缓存，共 {len(translation_cache)} 条")
+
+# ============================== #
+# 翻译缓存相关函数
+# ============================== #
+def _make_key(text: str, lang: str) -> str:
+    # 统一全半角并合并空白，复制粘贴带来的细微差异也能命中
+    normalized = " ".join(unicodedata.normalize("NFKC", text).split())
+    digest = hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+    return f"{digest}::{lang.strip().lower()}"
+
+def get_cached_translation(text: str, lang: str) -> Optional[str]:
+    key = _make_key(text, lang)
+    entry = translation_cache.get(key)
+    if entry and (time.time() - entry["timestamp"]) < TRANSLATION_CACHE_TTL:
+        translation_cache.move_to_end(key)
+        translation_cache_stats["hits"] += 1
+        return entry["text"]
+
+    if entry:
+        del translation_cache[key]
+    translation_cache_stats["misses"] += 1
+    return None
+
+def set_cached_translation(text: str, lang: str, translation: str):
+    key = _make_key(text, lang)
+    translation_cache[key] = {
+        "text": translation,
+        "timestamp": time.time()
+    }
+    translation_cache.move_to_end(key)
+    while len(translation_cache) > TRANSLATION_CACHE_MAX_ENTRIES:
+        translation_cache.popitem(last=False)
+    _save_translation_cache()
+
+def get_translation_cache_stats() -> dict:
+    return {**translation_cache_stats, "size": len(translation_cache)}